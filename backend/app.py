@@ -1,17 +1,52 @@
 from flask import Flask
 from flask_cors import CORS
 from config import Config
+from extensions import mongo
+from models.indexes import ensure_indexes
+from models.sighting_index import sighting_index
+from models.stats_store import stats_store
 from routes.pokemon import pokemon_bp
 from routes.images import images_bp
-from routes.game import game_bp
+from routes.game import game_bp, ensure_indexes as ensure_game_indexes
+from routes.metrics import metrics_bp
+from utils import metrics
+from utils.json_provider import ORJSONProvider
+from utils.response_cache import response_cache
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend communication
 
-# Register blueprints
-app.register_blueprint(pokemon_bp, url_prefix='/api')
-app.register_blueprint(images_bp)
-app.register_blueprint(game_bp)
+def create_app(config_class=Config):
+    app = Flask(__name__)
+    # ObjectId, datetime and numpy values are serialized by the provider, not by each route
+    app.json = ORJSONProvider(app)
+    app.config.from_object(config_class)
+    CORS(app)  # Enable CORS for frontend communication
+
+    # Single MongoClient (and connection pool) shared by all blueprints
+    mongo.init_app(app)
+    # Request timing for the API blueprints and MongoDB command metrics, served on /metrics
+    metrics.init_app(app, [pokemon_bp, images_bp, game_bp])
+
+    # Register blueprints
+    app.register_blueprint(pokemon_bp, url_prefix='/api')
+    app.register_blueprint(images_bp)
+    app.register_blueprint(game_bp)
+    app.register_blueprint(metrics_bp)
+
+    ensure_indexes(mongo.db)
+    ensure_game_indexes(mongo.db)
+
+    # Pokédex responses are cached per data version, which writes bump
+    response_cache.init_app(app)
+
+    # Static Pokémon stats are loaded once here and reloaded when the dataset version changes
+    stats_store.init_app(app)
+    stats_store.refresh(force=True)
+    # The cross-species sighting index is built in the background, then follows the same version
+    sighting_index.init_app(app)
+    sighting_index.start()
+
+    return app
+
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
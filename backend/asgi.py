@@ -0,0 +1,105 @@
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from quart import Quart
+from werkzeug.exceptions import HTTPException
+from config import Config
+from extensions import async_mongo
+from app import create_app
+from routes.async_api import async_api_bp
+from utils.json_provider import ORJSONProvider
+from utils.metrics import command_metrics, request_duration
+import time
+
+
+# The plain function behind asgiref's @sync_to_async-wrapped WsgiToAsgiInstance.run_wsgi_app
+_run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    # asgiref's WsgiToAsgi calls the WSGI app with thread_sensitive=True, i.e. every Flask
+    # request of the worker on one shared thread, one after the other. This one runs each
+    # request on its own thread of a pool, like a threaded WSGI server would.
+
+    def __init__(self, wsgi_application, max_workers):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        instance = WsgiToAsgiInstance(self.wsgi_application)
+        instance.run_wsgi_app = sync_to_async(partial(_run_wsgi_app, instance), thread_sensitive=False, executor=self.executor)
+        await instance(scope, receive, send)
+
+
+class AsyncDispatcher:
+    # Requests for routes with an async implementation go to the Quart app, where one
+    # event loop serves them all. Everything else (writes, the game, /metrics) goes to
+    # the Flask app, whose views run on a pool of WSGI_THREADS threads.
+
+    def __init__(self, async_app, wsgi_app, wsgi_threads):
+        self.async_app = async_app
+        self.wsgi_app = PooledWsgiToAsgi(wsgi_app, wsgi_threads)
+        self._urls = async_app.url_map.bind('')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.async_app(scope, receive, send)
+        if scope['type'] == 'http':
+            try:
+                endpoint, _ = self._urls.match(scope['path'], method=scope['method'])
+            except HTTPException:
+                endpoint = None
+            if endpoint:
+                return await self._timed(endpoint, scope, receive, send)
+        return await self.wsgi_app(scope, receive, send)
+
+    async def _timed(self, endpoint, scope, receive, send):
+        # Same metric as the Flask middleware; here it includes sending a streamed body
+        status = []
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.async_app(scope, receive, send_with_status)
+        finally:
+            request_duration.observe(
+                time.perf_counter() - started,
+                'async_api', endpoint.rsplit('.', 1)[-1], scope['method'], status[0] if status else 500
+            )
+
+
+def create_asgi_app(config_class=Config):
+    # The Flask app serves the routes without an async version; creating it also
+    # ensures the indexes and loads the stats store, as in the WSGI mode
+    wsgi_app = create_app(config_class)
+
+    app = Quart(__name__)
+    app.json = ORJSONProvider(app)
+    app.config.from_object(config_class)
+    async_mongo.add_listener(command_metrics)
+    async_mongo.init_app(app)
+    app.register_blueprint(async_api_bp)
+
+    @app.after_request
+    async def _allow_any_origin(response):
+        # Same policy as CORS(app) on the Flask side; these routes are all simple GETs
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        return response
+
+    dispatcher = AsyncDispatcher(app, wsgi_app, config_class.WSGI_THREADS)
+
+    @app.after_serving
+    async def _close_mongo():
+        await async_mongo.close()
+        dispatcher.wsgi_app.executor.shutdown(wait=False)
+
+    return dispatcher
+
+
+# Entry point for ASGI servers, e.g. gunicorn -c gunicorn.conf.py asgi:app
+app = create_asgi_app()
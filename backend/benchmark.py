@@ -0,0 +1,392 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib import request as urllib_request
+from urllib.error import HTTPError
+from urllib.parse import quote
+import gridfs
+import numpy as np
+import pymongo
+from PIL import Image
+from pymongo import monitoring
+from config import Config
+
+# Load/benchmark harness for the API.
+#
+#   python benchmark.py seed --scale 10      # synthetic dataset, 10x the real 293k sightings
+#   python benchmark.py run --output baseline.json
+#   python benchmark.py run --compare baseline.json
+#
+# Seeding writes PokemonStats/PokemonSightings rows shaped like the CSV imports and then
+# runs the real pokemon_script.py rebuild on them, so every derived collection has
+# exactly the shape the API reads in production.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend'))
+import pokemon_script  # noqa: E402
+
+# Benchmarks never touch the real database; the user needs readWrite on BENCH_DB_NAME
+BENCH_DB_NAME = os.environ.get('BENCH_DB_NAME', 'PokeMapBench')
+BENCH_MONGO_URI = os.environ.get('BENCH_MONGO_URI', Config.MONGO_URI)
+
+# Size of the real datasets the scale factor multiplies
+BASE_SIGHTINGS = 293000
+POKEMON_COUNT = 151
+INSERT_BATCH_SIZE = 10000
+# Longest side of the real sprites, so every derivative size is generated from them
+SPRITE_SIZE = 475
+
+TYPES = [
+    'Normal', 'Fire', 'Water', 'Electric', 'Grass', 'Ice', 'Fighting', 'Poison', 'Ground',
+    'Flying', 'Psychic', 'Bug', 'Rock', 'Ghost', 'Dragon', 'Dark', 'Steel', 'Fairy'
+]
+SORT_OPTIONS = ['No.', 'Name', 'HP', 'Attack', 'Defense', 'Speed', 'Height', 'Weight', 'Capture Rate']
+
+
+def seed(db_name, scale, seed_value):
+    if db_name == Config.MONGO_DB_NAME:
+        raise SystemExit(f"Refusing to seed the application database '{db_name}'; pick another --db.")
+
+    client = pymongo.MongoClient(BENCH_MONGO_URI)
+    db = client[db_name]
+    fs = gridfs.GridFS(db, collection='images')
+    rng = np.random.default_rng(seed_value)
+
+    print(f"Seeding {db_name} at {scale}x...")
+    for name in ['PokemonStats', 'PokemonSightings', 'PokemonComments', 'EtlCheckpoints', 'Meta',
+                 'images.files', 'images.chunks'] + pokemon_script.LIVE_COLLECTIONS:
+        db[name].drop()
+
+    stats = []
+    for number in range(1, POKEMON_COUNT + 1):
+        primary, secondary = rng.choice(len(TYPES), size=2, replace=False)
+        stats.append({
+            "No": number,
+            "Name": f"Pokemon{number:03d}",
+            "HP": int(rng.integers(20, 256)),
+            "Att": int(rng.integers(5, 191)),
+            "Def": int(rng.integers(5, 231)),
+            "S": {"Att": int(rng.integers(10, 195)), "Def": int(rng.integers(20, 231))},
+            "Spd": int(rng.integers(5, 181)),
+            "PrimaryType": TYPES[primary],
+            "SecondaryType": TYPES[secondary] if rng.random() < 0.4 else "",
+            "Ability1": "Overgrow",
+            "Ability2": "",
+            "HiddenAbility": "",
+            "Generation": 1,
+            "Height (m)": round(float(rng.uniform(0.2, 8.8)), 1),
+            "Weight (kg)": round(float(rng.uniform(0.1, 460)), 1),
+            "Capture Rate": int(rng.choice([3, 45, 75, 120, 190, 255])),
+            "overall_legendary": "1" if rng.random() < 0.03 else "0"
+        })
+    db['PokemonStats'].insert_many(stats)
+
+    # Sightings follow a long-tailed distribution over species, like the real data (Pidgey alone is ~18%)
+    weights = 1.0 / np.arange(1, POKEMON_COUNT + 1) ** 1.1
+    weights /= weights.sum()
+    species = rng.permutation(POKEMON_COUNT) + 1
+    total = int(BASE_SIGHTINGS * scale)
+    start = datetime(2016, 8, 1)
+    for offset in range(0, total, INSERT_BATCH_SIZE):
+        size = min(INSERT_BATCH_SIZE, total - offset)
+        classes = species[rng.choice(POKEMON_COUNT, size=size, p=weights)]
+        latitudes = np.clip(rng.normal(35, 20, size), -85, 85)
+        longitudes = rng.uniform(-180, 180, size)
+        seconds = rng.integers(0, 60 * 86400, size)
+        db['PokemonSightings'].insert_many([
+            {
+                "class": int(classes[i]),
+                "latitude": float(latitudes[i]),
+                "longitude": float(longitudes[i]),
+                "appearedLocalTime": (start + timedelta(seconds=int(seconds[i]))).strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            for i in range(size)
+        ], ordered=False)
+    print(f"Inserted {POKEMON_COUNT} Pokémon and {total} sightings.")
+
+    # Real PNG sprites, a flat colour around a noisy patch, so the rebuild can decode and resize them
+    with tempfile.TemporaryDirectory() as image_folder:
+        for number in range(1, POKEMON_COUNT + 1):
+            sprite = Image.new("RGBA", (SPRITE_SIZE, SPRITE_SIZE), tuple(int(c) for c in rng.integers(0, 256, 4)))
+            noise = rng.integers(0, 256, (SPRITE_SIZE // 4, SPRITE_SIZE // 4, 4), dtype=np.uint8)
+            sprite.paste(Image.fromarray(noise), (3 * SPRITE_SIZE // 8, 3 * SPRITE_SIZE // 8))
+            sprite.save(os.path.join(image_folder, f"{number}.png"), "PNG")
+        pokemon_script.IMAGE_FOLDER = image_folder
+        pokemon_script.full_rebuild(db, fs)
+
+    db['Meta'].update_one({"_id": "benchmark"}, {"$set": {"scale": scale, "seed": seed_value}}, upsert=True)
+    print("Seeding completed.")
+
+
+class CommandCounter(monitoring.CommandListener):
+    # Counts MongoDB commands issued by the current thread, i.e. by the request it is serving
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def started(self, event):
+        self._local.count = self.count + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _scenarios(db):
+    # name -> (setup, request); setup runs untimed and its result is passed to request
+    merged = list(db.MergedPokemonSightings.find({}, {"pokemon.pokemonId": 1, "image_path": 1, "sightings_count": 1}))
+    if not merged:
+        raise SystemExit("The benchmark database is empty; run 'python benchmark.py seed' first.")
+    by_sightings = sorted(merged, key=lambda doc: doc.get('sightings_count', 0), reverse=True)
+    popular = [doc['pokemon']['pokemonId'] for doc in by_sightings[:10]]
+    image_ids = [str(doc['image_path']) for doc in merged if doc.get('image_path')]
+
+    def no_setup(call):
+        return None
+
+    def pokemon_list(call, _):
+        page = random.randint(1, 7)
+        sort_option = random.choice(SORT_OPTIONS)
+        return 'GET', f"/api/pokemon?perPage=20&page={page}&sortOption={quote(sort_option)}", None
+
+    def pokemon_list_card(call, _):
+        return 'GET', f"/api/pokemon?view=card&primaryType={random.choice(TYPES)}", None
+
+    def sightings_radius(call, _):
+        latitude = round(random.uniform(-50, 60), 4)
+        longitude = round(random.uniform(-170, 170), 4)
+        return 'GET', (f"/api/pokemon/{random.choice(popular)}/sightings"
+                       f"?latitude={latitude}&longitude={longitude}&radius=1000&limit=500"), None
+
+    def image(call, _):
+        return 'GET', f"/api/images/{random.choice(image_ids)}", None
+
+    def image_card(call, _):
+        return 'GET', f"/api/images/{random.choice(image_ids)}?size=256&format=webp", None
+
+    def game_start(call, _):
+        return 'GET', "/api/game/start", None
+
+    def new_battle(call):
+        started = call('GET', "/api/game/start", None)
+        selected = [p['_id'] for p in started['userPokemon'][:3]]
+        call('POST', "/api/game/select", {"sessionId": started['sessionId'], "selected": selected})
+        return started['sessionId']
+
+    def game_turn(call, session_id):
+        return 'POST', "/api/game/turn", {"sessionId": session_id, "action": "attack"}
+
+    return {
+        "pokemon_list": (no_setup, pokemon_list),
+        "pokemon_list_card": (no_setup, pokemon_list_card),
+        "sightings_radius": (no_setup, sightings_radius),
+        "image": (no_setup, image),
+        "image_card": (no_setup, image_card),
+        "game_start": (no_setup, game_start),
+        "game_turn": (new_battle, game_turn)
+    }
+
+
+class InProcessClient:
+    # Drives the app through the Flask test client, so Mongo commands can be attributed to requests
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        response = client.open(path, method=method, json=body)
+        data = response.get_data()  # Consumes streamed responses as well
+        return response.status_code, data
+
+
+class HTTPClient:
+    # Drives an already running server; Mongo ops can't be observed from here
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib_request.Request(self._base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib_request.urlopen(req) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+
+def _run_scenario(client, counter, setup, make_request, requests, concurrency):
+    def call(method, path, body):
+        status, data = client.request(method, path, body)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}: {data[:200]!r}")
+        return json.loads(data)
+
+    def one(_):
+        prepared = setup(call)
+        method, path, body = make_request(call, prepared)
+        if counter:
+            counter.reset()
+        started = time.perf_counter()
+        status, data = client.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        return elapsed, status, len(data), counter.count if counter else None
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - wall_started
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    sizes = np.array([r[2] for r in results])
+    ops = [r[3] for r in results if r[3] is not None]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "latencyMs": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "mean": round(float(latencies.mean()), 3),
+            "max": round(float(latencies.max()), 3)
+        },
+        # Wall-clock rate including untimed setup requests, so only comparable between runs of the same scenario
+        "throughputRps": round(requests / wall, 2),
+        "responseBytes": {"mean": round(float(sizes.mean()), 1), "max": int(sizes.max())},
+        "mongoOpsPerRequest": round(sum(ops) / len(ops), 3) if ops else None,
+        "statusCodes": dict(sorted(Counter(str(r[1]) for r in results).items()))
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(db_name, base_url, scenarios, requests, concurrency, warmup, seed_value):
+    random.seed(seed_value)
+    client_db = pymongo.MongoClient(BENCH_MONGO_URI)[db_name]
+    available = _scenarios(client_db)
+    unknown = [name for name in scenarios if name not in available]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}. Available: {', '.join(available)}")
+
+    counter = None
+    if base_url:
+        client = HTTPClient(base_url)
+    else:
+        # Registered before the app creates its MongoClient so the listener is attached to it
+        counter = CommandCounter()
+        monitoring.register(counter)
+        from app import create_app
+
+        class BenchConfig(Config):
+            MONGO_URI = BENCH_MONGO_URI
+            MONGO_DB_NAME = db_name
+
+        client = InProcessClient(create_app(BenchConfig))
+
+    benchmark_meta = client_db.Meta.find_one({"_id": "benchmark"}) or {}
+    report = {
+        "meta": {
+            "date": datetime.utcnow().isoformat(timespec='seconds'),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "db": db_name,
+            "target": base_url or "in-process",
+            "scale": benchmark_meta.get("scale"),
+            "sightings": client_db.PokemonSightingPoints.estimated_document_count(),
+            "seed": seed_value
+        },
+        "scenarios": {}
+    }
+
+    for name in scenarios:
+        setup, make_request = available[name]
+        if warmup:
+            _run_scenario(client, None, setup, make_request, warmup, concurrency)
+        print(f"Running {name}: {requests} requests at concurrency {concurrency}...")
+        result = _run_scenario(client, counter, setup, make_request, requests, concurrency)
+        report["scenarios"][name] = result
+        latency = result["latencyMs"]
+        print(f"  p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+              f"{result['throughputRps']} req/s  {result['responseBytes']['mean']:.0f} B  "
+              f"ops {result['mongoOpsPerRequest']}")
+    return report
+
+
+def compare(report, baseline):
+    # Relative change of the headline numbers against a previous report
+    print(f"Compared with {baseline['meta'].get('commit')} ({baseline['meta'].get('date')}):")
+    for name, result in report["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if not previous:
+            continue
+        changes = []
+        for key in ("p50", "p95", "p99"):
+            before, after = previous["latencyMs"][key], result["latencyMs"][key]
+            changes.append(f"{key} {(after - before) / before * 100:+.1f}%" if before else f"{key} n/a")
+        before, after = previous["throughputRps"], result["throughputRps"]
+        changes.append(f"throughput {(after - before) / before * 100:+.1f}%" if before else "throughput n/a")
+        print(f"  {name}: " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database and measure the API against it.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help="load a synthetic dataset")
+    seed_parser.add_argument('--db', default=BENCH_DB_NAME)
+    seed_parser.add_argument('--scale', type=float, default=1.0, help="multiple of the 293k real sightings")
+    seed_parser.add_argument('--seed', type=int, default=42)
+
+    run_parser = subparsers.add_parser('run', help="drive the endpoints and write a JSON report")
+    run_parser.add_argument('--db', default=BENCH_DB_NAME)
+    run_parser.add_argument('--url', help="benchmark a running server instead of an in-process app")
+    run_parser.add_argument('--scenarios', default="pokemon_list,pokemon_list_card,sightings_radius,image,game_start,game_turn")
+    run_parser.add_argument('--requests', type=int, default=500, help="timed requests per scenario")
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--warmup', type=int, default=50)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', default='bench_baseline.json')
+    run_parser.add_argument('--compare', help="previous report to compare against")
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        seed(args.db, args.scale, args.seed)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    report = run(args.db, args.url, scenarios, args.requests, args.concurrency, args.warmup, args.seed)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+    print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
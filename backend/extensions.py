@@ -0,0 +1,123 @@
+import os
+import threading
+from pymongo import AsyncMongoClient, MongoClient
+from gridfs import AsyncGridFS, GridFS
+
+
+def client_settings(config, listeners):
+    # MongoClient/AsyncMongoClient keyword arguments from the app config
+    return {
+        'host': config['MONGO_URI'],
+        'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+        'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+        'maxIdleTimeMS': config['MONGO_MAX_IDLE_TIME_MS'],
+        'connectTimeoutMS': config['MONGO_CONNECT_TIMEOUT_MS'],
+        'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        'socketTimeoutMS': config['MONGO_SOCKET_TIMEOUT_MS'],
+        'waitQueueTimeoutMS': config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        'compressors': config['MONGO_COMPRESSORS'],
+        'readPreference': config['MONGO_READ_PREFERENCE'],
+        'event_listeners': listeners,
+        # Don't open connections until the first operation in this process
+        'connect': False
+    }
+
+
+class Mongo:
+    # One MongoClient per process, shared by all blueprints.
+    # The client is created lazily and re-created after a fork (e.g. gunicorn
+    # pre-fork workers), since a MongoClient must not be used across processes.
+
+    def __init__(self):
+        self._settings = None
+        self._db_name = None
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def init_app(self, app):
+        config = app.config
+        self._db_name = config['MONGO_DB_NAME']
+        self._settings = client_settings(config, self._listeners)
+        app.extensions['mongo'] = self
+
+    def add_listener(self, listener):
+        # Monitoring listeners must be known when the client is created
+        if self._client is not None:
+            raise RuntimeError("Listeners must be added before the MongoClient is first used.")
+        self._listeners.append(listener)
+
+    @property
+    def client(self):
+        if self._settings is None:
+            raise RuntimeError("Mongo.init_app() has not been called.")
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # The parent's client is dropped, not closed: its sockets belong to the parent
+                    self._client = MongoClient(**self._settings)
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self._db_name]
+
+    @property
+    def fs(self):
+        return GridFS(self.db, collection='images')
+
+    def close(self):
+        if self._client is not None and self._pid == os.getpid():
+            self._client.close()
+        self._client = None
+
+
+class AsyncMongo:
+    # The async serving mode's counterpart of Mongo (see asgi.py). An AsyncMongoClient
+    # belongs to the event loop it first runs on, and each ASGI worker process has one loop.
+
+    def __init__(self):
+        self._settings = None
+        self._db_name = None
+        self._client = None
+        self._pid = None
+        self._listeners = []
+
+    def init_app(self, app):
+        self._db_name = app.config['MONGO_DB_NAME']
+        self._settings = client_settings(app.config, self._listeners)
+        app.extensions['async_mongo'] = self
+
+    def add_listener(self, listener):
+        if self._client is not None:
+            raise RuntimeError("Listeners must be added before the AsyncMongoClient is first used.")
+        self._listeners.append(listener)
+
+    @property
+    def client(self):
+        if self._settings is None:
+            raise RuntimeError("AsyncMongo.init_app() has not been called.")
+        # No lock needed: the client is only created from coroutines on the worker's single event loop
+        if self._client is None or self._pid != os.getpid():
+            self._client = AsyncMongoClient(**self._settings)
+            self._pid = os.getpid()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self._db_name]
+
+    @property
+    def fs(self):
+        return AsyncGridFS(self.db, collection='images')
+
+    async def close(self):
+        if self._client is not None and self._pid == os.getpid():
+            await self._client.close()
+        self._client = None
+
+
+mongo = Mongo()
+async_mongo = AsyncMongo()
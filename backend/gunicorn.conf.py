@@ -0,0 +1,26 @@
+# Production launcher for the async serving mode:
+#
+#   gunicorn -c gunicorn.conf.py asgi:app
+#
+# Each worker is a uvicorn event loop that serves the async routes concurrently on
+# one AsyncMongoClient; the remaining Flask routes run concurrently on a pool of
+# WSGI_THREADS threads per worker (asgiref's default would run them one at a time).
+# The WSGI mode still works with the same file: gunicorn -c gunicorn.conf.py -k sync "app:create_app()"
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = os.environ.get('WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+
+# Requests can wait on MongoDB for up to MONGO_SOCKET_TIMEOUT_MS; give them a margin
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't accumulate; jitter avoids restarting all at once
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,188 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import os
+import threading
+
+# Battles end after this many turns, won by the team with more remaining health
+MAX_TURNS = 10
+TEAM_SIZE = 3
+
+# Outcome codes used by the vectorized simulator
+UNDECIDED, USER_WINS, CPU_WINS, DRAW = 0, 1, 2, 3
+WINNER_NAMES = {USER_WINS: "User", CPU_WINS: "CPU", DRAW: "Draw"}
+
+
+def battle_stats(hp, attack, defense, speed):
+    # Health is HP + Defense, attack power is full attack + 1/3 of speed
+    return hp + defense, attack + (speed / 3)
+
+
+def play_turn(user_team, cpu_team, current_turn):
+    # Applies one turn to both teams in place and returns the log, the health changes and the outcome
+    battle_log = []
+    changes = []
+
+    # User's turn to attack
+    user_alive_pokemon = [p for p in user_team if p['health'] > 0]  # Only alive Pokémon contribute to attack
+    if user_alive_pokemon:
+        user_combined_attack = sum(p['attackPower'] for p in user_alive_pokemon)
+        user_attack_per_pokemon = user_combined_attack / len(user_alive_pokemon)
+        battle_log.append(f"Turn {current_turn}: User's team deals {user_attack_per_pokemon:.2f} damage to all CPU Pokémon.")
+
+        for index, cpu_pokemon in enumerate(cpu_team):
+            if cpu_pokemon['health'] > 0:
+                cpu_pokemon['health'] -= user_attack_per_pokemon
+                if cpu_pokemon['health'] <= 0:
+                    cpu_pokemon['health'] = 0
+                    battle_log.append(f"CPU's {cpu_pokemon['name']} faints.")
+                changes.append({"team": "cpu", "index": index, "health": cpu_pokemon['health']})
+
+    # CPU's turn to attack
+    cpu_alive_pokemon = [p for p in cpu_team if p['health'] > 0]  # Only alive Pokémon contribute to attack
+    if cpu_alive_pokemon:
+        cpu_combined_attack = sum(p['attackPower'] for p in cpu_alive_pokemon)
+        cpu_attack_per_pokemon = cpu_combined_attack / len(cpu_alive_pokemon)
+        battle_log.append(f"Turn {current_turn}: CPU's team deals {cpu_attack_per_pokemon:.2f} damage to all User Pokémon.")
+
+        for index, user_pokemon in enumerate(user_team):
+            if user_pokemon['health'] > 0:
+                user_pokemon['health'] -= cpu_attack_per_pokemon
+                if user_pokemon['health'] <= 0:
+                    user_pokemon['health'] = 0
+                    battle_log.append(f"User's {user_pokemon['name']} faints.")
+                changes.append({"team": "user", "index": index, "health": user_pokemon['health']})
+
+    # Check if the game is over
+    user_alive = any(p['health'] > 0 for p in user_team)
+    cpu_alive = any(p['health'] > 0 for p in cpu_team)
+    game_over = not (user_alive and cpu_alive)
+    winner = None
+    if game_over:
+        winner = "User" if user_alive else "CPU" if cpu_alive else "Draw"
+        battle_log.append(f"Game Over! {winner} wins!")
+
+    return battle_log, changes, game_over, winner
+
+
+def winner_by_health(user_team, cpu_team):
+    # Used once the maximum number of turns has been played
+    user_total_health = sum(p['health'] for p in user_team if p['health'] > 0)
+    cpu_total_health = sum(p['health'] for p in cpu_team if p['health'] > 0)
+    return "User" if user_total_health > cpu_total_health else "CPU" if cpu_total_health > user_total_health else "Draw"
+
+
+def _attack(attacker_health, attacker_power, defender_health, active):
+    # One side's attack across all battles: the mean attack power of the attacker's
+    # living Pokémon is dealt to every living defender, as in play_turn
+    alive = attacker_health > 0
+    alive_count = alive.sum(axis=1)
+    attacking = active & (alive_count > 0)
+    damage = np.zeros(len(attacker_health))
+    damage[attacking] = (attacker_power * alive).sum(axis=1)[attacking] / alive_count[attacking]
+
+    hit = (defender_health > 0) & attacking[:, None]
+    defender_health[hit] = np.maximum(defender_health - damage[:, None], 0)[hit]
+
+
+def simulate(user_health, user_power, cpu_health, cpu_power, max_turns=MAX_TURNS):
+    # Plays N battles at once. Inputs are (N, team size) arrays; returns each
+    # battle's outcome code, the number of turns played and whether it was
+    # decided by remaining health, following the same rules and operation order
+    # as play_turn and winner_by_health.
+    user_health = np.array(user_health, dtype=np.float64)
+    cpu_health = np.array(cpu_health, dtype=np.float64)
+    user_power = np.asarray(user_power, dtype=np.float64)
+    cpu_power = np.asarray(cpu_power, dtype=np.float64)
+
+    battles = len(user_health)
+    outcome = np.full(battles, UNDECIDED, dtype=np.int8)
+    turns = np.zeros(battles, dtype=np.int32)
+
+    for turn in range(1, max_turns + 1):
+        active = outcome == UNDECIDED
+        if not active.any():
+            break
+        turns[active] = turn
+
+        _attack(user_health, user_power, cpu_health, active)
+        _attack(cpu_health, cpu_power, user_health, active)
+
+        user_alive = (user_health > 0).any(axis=1)
+        cpu_alive = (cpu_health > 0).any(axis=1)
+        finished = active & ~(user_alive & cpu_alive)
+        outcome[finished & user_alive] = USER_WINS
+        outcome[finished & cpu_alive] = CPU_WINS
+        outcome[finished & ~user_alive & ~cpu_alive] = DRAW
+
+    # Battles still running after the last turn are decided by remaining health
+    remaining = outcome == UNDECIDED
+    user_total = np.where(user_health > 0, user_health, 0).sum(axis=1)
+    cpu_total = np.where(cpu_health > 0, cpu_health, 0).sum(axis=1)
+    outcome[remaining & (user_total > cpu_total)] = USER_WINS
+    outcome[remaining & (cpu_total > user_total)] = CPU_WINS
+    outcome[remaining & (user_total == cpu_total)] = DRAW
+
+    return outcome, turns, remaining
+
+
+def _simulate_shard(args):
+    return simulate(*args)
+
+
+# Worker processes for simulate_sharded, started on first use and kept for later requests.
+# Re-created after a fork (e.g. gunicorn pre-fork workers) or when a worker process died.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _shard_executor(workers):
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _drop_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def simulate_sharded(user_health, user_power, cpu_health, cpu_power, max_turns=MAX_TURNS, workers=1):
+    # Splits the battles into one shard per worker process; results keep the input order
+    if workers <= 1 or len(user_health) < workers:
+        return simulate(user_health, user_power, cpu_health, cpu_power, max_turns)
+
+    shards = zip(
+        np.array_split(np.asarray(user_health), workers),
+        np.array_split(np.asarray(user_power), workers),
+        np.array_split(np.asarray(cpu_health), workers),
+        np.array_split(np.asarray(cpu_power), workers),
+        [max_turns] * workers
+    )
+    executor = _shard_executor(workers)
+    try:
+        results = list(executor.map(_simulate_shard, shards))
+    except BrokenProcessPool:
+        _drop_executor(executor)
+        raise
+    return tuple(np.concatenate([r[i] for r in results]) for i in range(3))
+
+
+def summarize(outcome, turns, by_health):
+    battles = len(outcome)
+    return {
+        "battles": battles,
+        "userWinRate": float((outcome == USER_WINS).sum() / battles),
+        "cpuWinRate": float((outcome == CPU_WINS).sum() / battles),
+        "drawRate": float((outcome == DRAW).sum() / battles),
+        "averageTurns": float(turns.mean()),
+        # Battles that were still undecided after the last turn
+        "decidedByHealthRate": float(by_health.sum() / battles)
+    }
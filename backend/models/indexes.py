@@ -0,0 +1,58 @@
+from pymongo import IndexModel
+
+# Indexes of every collection written by pokemon_script.py. The ETL builds them on its staging
+# collections before renaming them over the live ones (a rename keeps the staging indexes),
+# and create_app ensures them at startup. Plain pymongo only: the ETL imports this module too.
+
+# sortOption -> (field, direction); every option is backed by the indexes below
+SORT_OPTIONS = {
+    'No.': ('pokemon.pokemonId', 1),
+    'Name': ('pokemon.name', 1),
+    'HP': ('pokemon.hp', -1),
+    'Attack': ('pokemon.attack', -1),
+    'Defense': ('pokemon.defense', -1),
+    'Speed': ('pokemon.speed', -1),
+    'Height': ('pokemon.height', -1),
+    'Weight': ('pokemon.weight', -1),
+    'Capture Rate': ('pokemon.capture_rate', 1)
+}
+
+# One document per Pokémon, compound indexes for each sortOption alone and behind the
+# primary type filter, plus the normalized search fields
+POKEMON_INDEXES = [
+    IndexModel([("pokemon.pokemonId", 1)], unique=True),
+    IndexModel([("search.name_grams", 1)]),
+    IndexModel([("search.secondary_type", 1)])
+]
+for _field, _direction in SORT_OPTIONS.values():
+    POKEMON_INDEXES.append(IndexModel([(_field, _direction), ("_id", _direction)]))
+    POKEMON_INDEXES.append(IndexModel([("search.primary_type", 1), (_field, _direction), ("_id", _direction)]))
+
+COLLECTION_INDEXES = {
+    'MergedPokemonSightings': POKEMON_INDEXES,
+    # Bucket lookups by Pokémon, geospatial/date queries on the points
+    'PokemonSightingBuckets': [IndexModel([("pokemonId", 1), ("period", 1), ("cell", 1)])],
+    'PokemonSightingPoints': [
+        IndexModel([("pokemonId", 1), ("location", "2dsphere"), ("date", 1)]),
+        IndexModel([("pokemonId", 1), ("date", 1)])
+    ],
+    # Daily rollups per geohash cell and per Pokémon; the unique keys are the incremental $merge targets
+    'SightingRollupsByCell': [
+        IndexModel([("pokemonId", 1), ("cell", 1), ("day", 1)], unique=True),
+        IndexModel([("day", 1)])
+    ],
+    'SightingRollups': [
+        IndexModel([("pokemonId", 1), ("day", 1)], unique=True),
+        IndexModel([("day", 1)])
+    ],
+    # Comments are read newest first per Pokémon, _id breaks ties between equal dates
+    'PokemonComments': [IndexModel([("pokemonId", 1), ("date", 1), ("_id", 1)])],
+    # Image derivatives are looked up by the _id of their original
+    'images.files': [IndexModel([("metadata.source", 1)])]
+}
+
+
+def ensure_indexes(db, names=None, suffix=''):
+    # Creates the indexes of the named collections (all by default) on db[name + suffix]
+    for name in names or COLLECTION_INDEXES:
+        db[name + suffix].create_indexes(COLLECTION_INDEXES[name])
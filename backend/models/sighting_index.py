@@ -0,0 +1,271 @@
+import itertools
+import logging
+import threading
+import numpy as np
+from extensions import mongo
+from models.stats_store import stats_store
+
+# Mean Earth radius in km, as used for the haversine distances
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+# Points read from the cursor and written into the arrays at a time
+BUILD_BATCH_SIZE = 10000
+
+
+def _haversine(latitude, longitude, latitudes, longitudes):
+    # Great-circle distance in km from one point to arrays of points
+    lat1, lng1 = np.radians(latitude), np.radians(longitude)
+    lat2, lng2 = np.radians(latitudes.astype(np.float64)), np.radians(longitudes.astype(np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _grow(array, capacity):
+    grown = np.empty(capacity, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _datetimes(dates):
+    # appearedLocalTime strings as datetime64; anything unparsable becomes NaT
+    try:
+        return np.array(dates, dtype='datetime64[s]')
+    except ValueError:
+        converted = np.full(len(dates), np.datetime64('NaT'), dtype='datetime64[s]')
+        for i, date in enumerate(dates):
+            try:
+                converted[i] = np.datetime64(date, 's')
+            except (ValueError, TypeError):
+                pass
+        return converted
+
+
+class _Grid:
+    # Every sighting point as parallel NumPy arrays sorted by grid cell, so the points of a
+    # row of adjacent cells are one contiguous slice found with two binary searches
+
+    def __init__(self, species, codes, latitudes, longitudes, dates, cell_degrees):
+        self.species = species
+        self.cell_degrees = cell_degrees
+        self.columns = int(np.ceil(360 / cell_degrees))
+        self.rows = int(np.ceil(180 / cell_degrees))
+        cells = self._row(latitudes) * self.columns + self._column(longitudes)
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.codes = codes[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.dates = dates[order]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _row(self, latitudes):
+        return np.clip(((np.asarray(latitudes) + 90) // self.cell_degrees).astype(np.int64), 0, self.rows - 1)
+
+    def _column(self, longitudes):
+        return np.clip(((np.asarray(longitudes) + 180) // self.cell_degrees).astype(np.int64), 0, self.columns - 1)
+
+    def candidates(self, min_lat, max_lat, min_lng, max_lng):
+        # Positions of the points in every cell overlapping the box; longitudes may run past
+        # ±180, in which case the box wraps around the antimeridian
+        if max_lng - min_lng >= 360:
+            column_ranges = [(0, self.columns - 1)]
+        elif min_lng < -180:
+            column_ranges = [(0, int(self._column(max_lng))), (int(self._column(min_lng + 360)), self.columns - 1)]
+        elif max_lng > 180:
+            column_ranges = [(int(self._column(min_lng)), self.columns - 1), (0, int(self._column(max_lng - 360)))]
+        else:
+            column_ranges = [(int(self._column(min_lng)), int(self._column(max_lng)))]
+
+        slices = []
+        for row in range(int(self._row(max(min_lat, -90))), int(self._row(min(max_lat, 90))) + 1):
+            for first, last in column_ranges:
+                start = np.searchsorted(self.cells, row * self.columns + first, side='left')
+                end = np.searchsorted(self.cells, row * self.columns + last, side='right')
+                if end > start:
+                    slices.append(np.arange(start, end))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+
+class SightingIndex:
+    # In-memory spatial index over PokemonSightingPoints for queries across all species.
+    # Built on a background thread at startup and rebuilt the same way whenever the 'pokedex'
+    # version seen by the stats store changes; queries keep using the previous grid until the
+    # new one is ready, and get a 503 from the route until the first one is.
+
+    PROJECTION = {'_id': 0, 'pokemonId': 1, 'location.coordinates': 1, 'date': 1}
+
+    def __init__(self):
+        self._grid = None
+        self._version = None
+        self._cell_degrees = 0.25
+        self._lock = threading.Lock()
+        self._building = False
+
+    def init_app(self, app):
+        self._cell_degrees = app.config['SIGHTING_INDEX_CELL_DEGREES']
+        app.extensions['sighting_index'] = self
+
+    def start(self):
+        # Starts the first build; create_app calls this so the index is ready before it is queried
+        self._ensure_current()
+
+    def _build(self, version):
+        points = mongo.db.PokemonSightingPoints
+        # Preallocated from the collection's metadata count, grown if points were added since.
+        # float32 coordinates (about 1 m of precision) and datetime64 dates keep the index compact.
+        capacity = max(points.estimated_document_count(), 1)
+        codes = np.empty(capacity, dtype=np.int16)
+        latitudes = np.empty(capacity, dtype=np.float32)
+        longitudes = np.empty(capacity, dtype=np.float32)
+        dates = np.empty(capacity, dtype='datetime64[s]')
+        species = []
+        species_codes = {}
+        size = 0
+
+        def species_code(pokemon_id):
+            code = species_codes.get(pokemon_id)
+            if code is None:
+                code = species_codes[pokemon_id] = len(species)
+                species.append(pokemon_id)
+            return code
+
+        cursor = points.find({}, self.PROJECTION, batch_size=BUILD_BATCH_SIZE)
+        while True:
+            batch = list(itertools.islice(cursor, BUILD_BATCH_SIZE))
+            if not batch:
+                break
+            end = size + len(batch)
+            if end > capacity:
+                capacity = max(end, capacity * 2)
+                codes, latitudes, longitudes, dates = (
+                    _grow(array[:size], capacity) for array in (codes, latitudes, longitudes, dates)
+                )
+            coordinates = np.array([point['location']['coordinates'] for point in batch], dtype=np.float64)
+            longitudes[size:end] = coordinates[:, 0]
+            latitudes[size:end] = coordinates[:, 1]
+            codes[size:end] = [species_code(point['pokemonId']) for point in batch]
+            dates[size:end] = _datetimes([point.get('date') for point in batch])
+            size = end
+
+        grid = _Grid(species, codes[:size], latitudes[:size], longitudes[:size], dates[:size], self._cell_degrees)
+        self._grid = grid
+        self._version = version
+        logging.info(f"Sighting index built with {len(grid)} points")
+        return grid
+
+    def _rebuild_in_background(self, version):
+        def run():
+            try:
+                self._build(version)
+            except Exception as e:
+                logging.error(f"Error building the sighting index: {str(e)}")
+            finally:
+                self._building = False
+
+        self._building = True
+        threading.Thread(target=run, name='sighting-index', daemon=True).start()
+
+    def _ensure_current(self):
+        # A failed build leaves the version unchanged, so the next query starts another one
+        version = stats_store.version
+        if version != self._version and not self._building:
+            with self._lock:
+                if version != self._version and not self._building:
+                    self._rebuild_in_background(version)
+
+    def ready(self):
+        self._ensure_current()
+        return self._grid is not None
+
+    def grid(self):
+        self._ensure_current()
+        grid = self._grid
+        if grid is None:
+            raise RuntimeError("The sighting index is still being built")
+        return grid
+
+    def _filter_species(self, grid, positions, codes):
+        if codes is None:
+            return positions
+        return positions[np.isin(grid.codes[positions], codes)]
+
+    def _codes(self, grid, pokemon_ids):
+        # Species codes of the given Pokémon ids, or None for every species
+        if pokemon_ids is None:
+            return None
+        wanted = set(pokemon_ids)
+        return np.array([code for code, pokemon_id in enumerate(grid.species) if pokemon_id in wanted], dtype=np.int16)
+
+    def _results(self, grid, positions, distances):
+        # Same shape as the per-species sightings, plus the Pokémon id
+        results = []
+        for n, i in enumerate(positions):
+            sighting = {
+                "pokemonId": grid.species[grid.codes[i]],
+                "location": {"type": "Point", "coordinates": [
+                    round(float(grid.longitudes[i]), 6), round(float(grid.latitudes[i]), 6)
+                ]},
+                "date": None if np.isnat(grid.dates[i]) else str(grid.dates[i])
+            }
+            if distances is not None:
+                sighting["distance"] = float(distances[n])
+            results.append(sighting)
+        return results
+
+    def within_radius(self, latitude, longitude, radius, pokemon_ids=None, limit=None):
+        # Sightings within radius km, nearest first: (total matches, first `limit` of them)
+        grid = self.grid()
+        positions, distances = self._within(grid, latitude, longitude, radius, self._codes(grid, pokemon_ids))
+        order = np.argsort(distances, kind='stable')[:limit]
+        return len(positions), self._results(grid, positions[order], distances[order])
+
+    def nearest(self, latitude, longitude, k, pokemon_ids=None, max_radius=None):
+        # The k nearest sightings, searching rings of growing radius until k are found
+        grid = self.grid()
+        codes = self._codes(grid, pokemon_ids)
+        if max_radius is None:
+            max_radius = np.pi * EARTH_RADIUS_KM  # Half the circumference reaches every point
+        radius = min(grid.cell_degrees * KM_PER_DEGREE, max_radius)
+        while True:
+            positions, distances = self._within(grid, latitude, longitude, radius, codes)
+            if len(positions) >= k or radius >= max_radius:
+                break
+            radius = min(radius * 4, max_radius)
+        order = np.argsort(distances, kind='stable')[:k]
+        return len(order), self._results(grid, positions[order], distances[order])
+
+    def _within(self, grid, latitude, longitude, radius, codes):
+        # Bounding box of the circle in degrees; it spans every longitude near the poles
+        lat_delta = radius / KM_PER_DEGREE
+        min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+        if min_lat <= -90 or max_lat >= 90:
+            lng_delta = 180
+        else:
+            # Widest at the box edge closest to a pole
+            lng_delta = min(180, lat_delta / np.cos(np.radians(max(abs(min_lat), abs(max_lat)))))
+        positions = grid.candidates(min_lat, max_lat, longitude - lng_delta, longitude + lng_delta)
+        positions = self._filter_species(grid, positions, codes)
+        distances = _haversine(latitude, longitude, grid.latitudes[positions], grid.longitudes[positions])
+        inside = distances <= radius
+        return positions[inside], distances[inside]
+
+    def within_box(self, min_lat, max_lat, min_lng, max_lng, pokemon_ids=None, limit=None):
+        # Sightings inside the box, in grid order: (total matches, first `limit` of them).
+        # min_lng > max_lng selects a box across the antimeridian.
+        grid = self.grid()
+        if min_lng > max_lng:
+            min_lng -= 360
+        positions = grid.candidates(min_lat, max_lat, min_lng, max_lng)
+        positions = self._filter_species(grid, positions, self._codes(grid, pokemon_ids))
+        latitudes = grid.latitudes[positions]
+        longitudes = grid.longitudes[positions].astype(np.float64)
+        wrapped = np.where(longitudes > max_lng, longitudes - 360, longitudes)
+        inside = (latitudes >= min_lat) & (latitudes <= max_lat) & (wrapped >= min_lng) & (wrapped <= max_lng)
+        positions = positions[inside]
+        return len(positions), self._results(grid, positions[:limit], None)
+
+
+sighting_index = SightingIndex()
@@ -0,0 +1,119 @@
+import random
+import threading
+from extensions import mongo
+from utils.response_cache import POKEDEX_KEYS, data_version
+
+
+class PokemonRecord:
+    # Static Pokémon stats, without sightings or comments
+    __slots__ = (
+        '_id', 'pokemon_id', 'name', 'hp', 'attack', 'defense', 'speed', 'height', 'weight',
+        'capture_rate', 'primary_type', 'secondary_type', 'legendary', 'image_path', 'sightings_count'
+    )
+
+    def __init__(self, document):
+        pokemon = document['pokemon']
+        self._id = str(document['_id'])
+        self.pokemon_id = pokemon['pokemonId']
+        self.name = pokemon['name']
+        self.hp = pokemon['hp']
+        self.attack = pokemon['attack']
+        self.defense = pokemon['defense']
+        self.speed = pokemon['speed']
+        self.height = pokemon['height']
+        self.weight = pokemon['weight']
+        self.capture_rate = pokemon['capture_rate']
+        self.primary_type = pokemon['primary_type']
+        self.secondary_type = pokemon['secondary_type']
+        self.legendary = pokemon.get('legendary', False)
+        self.image_path = str(document['image_path']) if document.get('image_path') else None
+        self.sightings_count = document.get('sightings_count', 0)
+
+    def to_dict(self):
+        # Same shape as a MergedPokemonSightings document in the card view
+        return {
+            "_id": self._id,
+            "pokemon": {
+                "pokemonId": self.pokemon_id,
+                "name": self.name,
+                "hp": self.hp,
+                "attack": self.attack,
+                "defense": self.defense,
+                "speed": self.speed,
+                "height": self.height,
+                "weight": self.weight,
+                "capture_rate": self.capture_rate,
+                "primary_type": self.primary_type,
+                "secondary_type": self.secondary_type,
+                "legendary": self.legendary
+            },
+            "image_path": self.image_path,
+            "sightings_count": self.sightings_count
+        }
+
+
+class StatsStore:
+    # Read-only table of Pokémon stats held in memory. Stats only change when
+    # pokemon_script.py runs, which bumps the 'pokedex' version in the Meta
+    # collection; the table is reloaded as soon as the response cache sees that
+    # version change, so no cached response is built from the previous table.
+
+    PROJECTION = {
+        '_id': 1, 'image_path': 1, 'sightings_count': 1,
+        'pokemon.pokemonId': 1, 'pokemon.name': 1, 'pokemon.hp': 1, 'pokemon.attack': 1,
+        'pokemon.defense': 1, 'pokemon.speed': 1, 'pokemon.height': 1, 'pokemon.weight': 1,
+        'pokemon.capture_rate': 1, 'pokemon.primary_type': 1, 'pokemon.secondary_type': 1,
+        'pokemon.legendary': 1
+    }
+
+    def __init__(self):
+        # (records, pokemonId -> position) replaced as a whole on reload
+        self._table = ((), {})
+        self._version = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['stats_store'] = self
+
+    def refresh(self, force=False):
+        with self._lock:
+            version = data_version.current(POKEDEX_KEYS)
+            if self._loaded and not force and version == self._version:
+                return
+            cursor = mongo.db.MergedPokemonSightings.find({}, self.PROJECTION).sort('pokemon.pokemonId', 1)
+            records = tuple(PokemonRecord(document) for document in cursor)
+            # Swap in the new table in one step; readers keep using whichever table they already hold
+            self._table = (records, {record.pokemon_id: i for i, record in enumerate(records)})
+            self._version = version
+            self._loaded = True
+
+    def _ensure_fresh(self):
+        # The data version is itself cached for a few seconds, so checking it on every access is cheap
+        if not self._loaded or data_version.current(POKEDEX_KEYS) != self._version:
+            self.refresh()
+
+    @property
+    def version(self):
+        self._ensure_fresh()
+        return self._version
+
+    def records(self):
+        self._ensure_fresh()
+        return self._table[0]
+
+    def get(self, pokemon_id):
+        self._ensure_fresh()
+        records, index = self._table
+        i = index.get(pokemon_id)
+        return records[i] if i is not None else None
+
+    def sample(self, k):
+        records = self.records()
+        return [records[i] for i in random.sample(range(len(records)), k)]
+
+    def __len__(self):
+        return len(self.records())
+
+
+stats_store = StatsStore()
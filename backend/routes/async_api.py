@@ -0,0 +1,202 @@
+from quart import Blueprint, Response, jsonify, request
+from gridfs import AsyncGridOut
+from gridfs.errors import NoFile
+from config import Config
+from extensions import async_mongo
+from routes.images import (
+    IMAGE_MIMETYPES, image_cache, _image_etag, _image_format, _pick_variant, _requested_variant, _variant_query
+)
+from routes.pokemon import (
+    count_cache, SIGHTING_PROJECTION, _count_key, _facet_buckets, _facets_pipeline, _facets_response,
+    _filter_query, _list_plan, _list_response, _sightings_plan, _version_keys
+)
+from utils.json_provider import async_array_chunks, dumps_bytes
+from utils.response_cache import POKEDEX_KEYS, build_response, data_version, response_cache
+import asyncio
+import bson
+import logging
+
+# Async versions of the read-heavy routes, served by asgi.py. They build their queries
+# with the same helpers as the WSGI routes and only differ in how MongoDB is awaited.
+async_api_bp = Blueprint('async_api', __name__)
+
+
+async def _count_pokemon(query):
+    key = _count_key(query, await data_version.current_async(POKEDEX_KEYS))
+    total = count_cache.get(key)
+    if total is None:
+        total = await async_mongo.db.MergedPokemonSightings.count_documents(query)
+        count_cache.set(key, total)
+    return total
+
+
+async def _load_sightings(pokemon_ids):
+    sightings_by_pokemon = {pokemon_id: [] for pokemon_id in pokemon_ids}
+    buckets = async_mongo.db.PokemonSightingBuckets.find(
+        {"pokemonId": {"$in": list(pokemon_ids)}},
+        {"_id": 0, "pokemonId": 1, "sightings": 1}
+    ).sort([("pokemonId", 1), ("period", 1), ("cell", 1)])
+    async for bucket in buckets:
+        sightings_by_pokemon[bucket['pokemonId']].extend(bucket['sightings'])
+    return sightings_by_pokemon
+
+
+async def _chunks(image):
+    # Same as images._chunks: async iteration of an AsyncGridOut yields lines, not chunks
+    while True:
+        chunk = await image.readchunk()
+        if not chunk:
+            return
+        yield chunk
+
+
+def _image_response(body, etag, mimetype, length, vary=False):
+    response = Response(body, mimetype=mimetype)
+    response.content_length = length
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = Config.IMAGE_CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    if vary:
+        response.vary.add('Accept')
+    return response
+
+
+def _not_modified(etag, mimetype, vary):
+    response = _image_response(b'', etag, mimetype, 0, vary)
+    response.status_code = 304
+    return response
+
+
+@async_api_bp.route('/api/pokemon', methods=['GET'])
+async def get_all_pokemon():
+    try:
+        # Same response cache as the WSGI route; its version check is awaited on the async client
+        (key, version, etag), status, body = await response_cache.lookup_async(
+            request.path, request.args, request.if_none_match, _version_keys(request.args)
+        )
+        if status is not None:
+            return build_response(Response, body, etag, status)
+
+        try:
+            plan = _list_plan(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        cursor = (
+            async_mongo.db.MergedPokemonSightings
+            .find(plan['find_query'], plan['projection'])
+            .sort(plan['sort'])
+            .skip(plan['skip'])
+            .limit(plan['limit'])
+        )
+        # The total and the page are independent queries, so they run concurrently
+        total_pokemon, pokemon_data = await asyncio.gather(_count_pokemon(plan['query']), cursor.to_list())
+
+        if plan['include_sightings']:
+            sightings_by_pokemon = await _load_sightings([p['pokemon']['pokemonId'] for p in pokemon_data])
+            for pokemon in pokemon_data:
+                pokemon['sightings'] = sightings_by_pokemon[pokemon['pokemon']['pokemonId']]
+
+        body = dumps_bytes(_list_response(plan, pokemon_data, total_pokemon))
+        response_cache.set(key, version, body)
+        return build_response(Response, body, etag, 200)
+
+    except Exception as e:
+        logging.error(f"Error in async get_all_pokemon: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@async_api_bp.route('/api/pokemon/facets', methods=['GET'])
+async def get_pokemon_facets():
+    try:
+        (key, version, etag), status, body = await response_cache.lookup_async(
+            request.path, request.args, request.if_none_match, POKEDEX_KEYS
+        )
+        if status is not None:
+            return build_response(Response, body, etag, status)
+
+        try:
+            buckets = _facet_buckets(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        pipeline = _facets_pipeline(_filter_query(request.args), buckets)
+        cursor = await async_mongo.db.MergedPokemonSightings.aggregate(pipeline)
+        result = await cursor.next()
+
+        body = dumps_bytes(_facets_response(result))
+        response_cache.set(key, version, body)
+        return build_response(Response, body, etag, 200)
+    except Exception as e:
+        logging.error(f"Error in async get_pokemon_facets: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@async_api_bp.route('/api/pokemon/<pokemonId>/sightings', methods=['GET'])
+async def get_sightings_by_area(pokemonId):
+    try:
+        try:
+            plan = _sightings_plan(request.args, pokemonId)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Checked before the query, so no server-side cursor is left open on a 404
+        if not await async_mongo.db.MergedPokemonSightings.count_documents({"pokemon.pokemonId": pokemonId}, limit=1):
+            logging.debug(f"No Pokémon found for sightings with ID: {pokemonId}")
+            return jsonify({"error": f"Pokémon with ID {pokemonId} not found"}), 404
+
+        points = async_mongo.db.PokemonSightingPoints
+        if 'pipeline' in plan:
+            cursor = await points.aggregate(plan['pipeline'])
+        else:
+            cursor = points.find(plan['query'], SIGHTING_PROJECTION).sort("date", 1)
+            if plan['limit']:
+                cursor = cursor.limit(plan['limit'])
+
+        # Streamed from the cursor as batches arrive
+        return Response(async_array_chunks(cursor), mimetype='application/json')
+    except Exception as e:
+        logging.error(f"Error in async get_sightings_by_area for ID {pokemonId}: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@async_api_bp.route('/api/images/<image_id>', methods=['GET'])
+async def get_image(image_id):
+    try:
+        image_id = bson.ObjectId(image_id)
+        try:
+            size, formats, negotiated = _requested_variant(request.args, request.accept_mimetypes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Shares the in-process image cache with the WSGI route
+        key = (image_id, size, frozenset(formats))
+        cached = image_cache.get(key)
+        if cached:
+            data, etag, mimetype, vary = cached
+            if request.if_none_match.contains(etag):
+                return _not_modified(etag, mimetype, vary)
+            return _image_response(data, etag, mimetype, len(data), vary)
+
+        variants = await async_mongo.db['images.files'].find(_variant_query([image_id])).to_list()
+        variants.sort(key=lambda f: f['_id'] != image_id)
+        if not variants or variants[0]['_id'] != image_id:
+            raise NoFile(f"Image {image_id} not found")
+        file_doc = _pick_variant(variants, size, formats)
+        etag = _image_etag(file_doc)
+        mimetype = IMAGE_MIMETYPES[_image_format(file_doc)]
+        vary = negotiated and len(variants) > 1
+
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag, mimetype, vary)
+
+        image = AsyncGridOut(async_mongo.db.images, file_document=file_doc)
+        if image.length <= Config.IMAGE_CACHE_MAX_ITEM_BYTES:
+            data = await image.read()
+            image_cache.set(key, (data, etag, mimetype, vary), len(data))
+            return _image_response(data, etag, mimetype, len(data), vary)
+
+        # Large files are streamed chunk by chunk instead of being buffered
+        return _image_response(_chunks(image), etag, mimetype, image.length, vary)
+    except (bson.errors.InvalidId, NoFile) as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -1,86 +1,157 @@
 from flask import Blueprint, jsonify, request
-from pymongo import MongoClient
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
 from config import Config
-import random
+from extensions import mongo
+from models.stats_store import stats_store
+from models.battle import (
+    MAX_TURNS, TEAM_SIZE, battle_stats, play_turn, winner_by_health, simulate_sharded, summarize
+)
 import logging
+import numpy as np
 
 game_bp = Blueprint('game', __name__)
 
-# MongoDB connection with authentication
-client = MongoClient(Config.MONGO_URI)
-db = client['PokeMap']
-merged_collection = db['MergedPokemonSightings']
+
+def ensure_indexes(db):
+    # Battle sessions expire after BATTLE_SESSION_TTL seconds without a turn
+    db.BattleSessions.create_index("updated", expireAfterSeconds=Config.BATTLE_SESSION_TTL)
+
+
+def _battle_member(record):
+    # Health and attack power are computed here so clients can't forge them
+    health, attack_power = battle_stats(record.hp, record.attack, record.defense, record.speed)
+    return {
+        "_id": record._id,
+        "pokemonId": record.pokemon_id,
+        "name": record.name,
+        "health": health,
+        "maxHealth": health,
+        "attackPower": attack_power
+    }
+
+
+def _battle_card(member):
+    # Full Pokémon card plus the server-side battle stats, as rendered by PokemonGame.js
+    record = stats_store.get(member['pokemonId'])
+    if record:
+        card = record.to_dict()
+    else:
+        card = {"_id": member['_id'], "pokemon": {"pokemonId": member['pokemonId'], "name": member['name']}}
+    card.update(health=member['health'], maxHealth=member['maxHealth'], attackPower=member['attackPower'])
+    return card
+
+
+def _team_arrays(team_ids, records, battles, rng):
+    # (battles, TEAM_SIZE) health and attack power arrays, for a fixed team or random distinct picks
+    stats = np.array([battle_stats(r.hp, r.attack, r.defense, r.speed) for r in records], dtype=np.float64)
+    health, power = stats[:, 0], stats[:, 1]
+
+    if team_ids:
+        positions = {r.pokemon_id: i for i, r in enumerate(records)}
+        picks = np.tile([positions[pid] for pid in team_ids], (battles, 1))
+    else:
+        # Like start_game, a random team never holds the same Pokémon twice
+        picks = rng.integers(0, len(records), size=(battles, TEAM_SIZE))
+        while True:
+            sorted_picks = np.sort(picks, axis=1)
+            duplicated = (sorted_picks[:, 1:] == sorted_picks[:, :-1]).any(axis=1)
+            if not duplicated.any():
+                break
+            picks[duplicated] = rng.integers(0, len(records), size=(duplicated.sum(), TEAM_SIZE))
+    return health[picks], power[picks]
+
+
+def _load_session(data):
+    try:
+        session_id = ObjectId(data.get('sessionId'))
+    except (InvalidId, TypeError):
+        return None
+    return mongo.db.BattleSessions.find_one({"_id": session_id})
+
 
 @game_bp.route('/api/game/start', methods=['GET'])
 def start_game():
     try:
-        # Fetch all Pokémon from MergedPokemonSightings
-        all_pokemon = list(merged_collection.find())
-        if not all_pokemon:
+        # Stats come from the in-memory stats store, not from MergedPokemonSightings
+        if len(stats_store) == 0:
             logging.error("No Pokémon found in the database.")
             return jsonify({"error": "No Pokémon found in the database."}), 404
 
-        # Ensure no duplicates by using a set of Pokémon IDs
-        pokemon_ids = [pokemon['pokemon']['pokemonId'] for pokemon in all_pokemon]
-        if len(pokemon_ids) < 10:  # Need at least 10 Pokémon (7 for user, 3 for CPU)
+        # Pokémon IDs are unique in the store, so sampling positions never yields duplicates
+        if len(stats_store) < 10:  # Need at least 10 Pokémon (7 for user, 3 for CPU)
             logging.error("Not enough Pokémon in the database to start the game.")
             return jsonify({"error": "Not enough Pokémon in the database to start the game."}), 404
 
         # Randomly select 7 Pokémon for the user
-        user_pokemon_ids = random.sample(pokemon_ids, 7)
-        user_pokemon = []
-        for pid in user_pokemon_ids:
-            pokemon = next(p for p in all_pokemon if p['pokemon']['pokemonId'] == pid)
-            user_pokemon.append({
-                "_id": str(pokemon['_id']),
-                "pokemon": {
-                    "pokemonId": pokemon['pokemon']['pokemonId'],
-                    "name": pokemon['pokemon']['name'],
-                    "hp": pokemon['pokemon']['hp'],
-                    "attack": pokemon['pokemon']['attack'],
-                    "defense": pokemon['pokemon']['defense'],
-                    "speed": pokemon['pokemon']['speed'],
-                    "height": pokemon['pokemon']['height'],
-                    "weight": pokemon['pokemon']['weight'],
-                    "capture_rate": pokemon['pokemon']['capture_rate'],
-                    "primary_type": pokemon['pokemon']['primary_type'],  # Add primary type
-                    "secondary_type": pokemon['pokemon']['secondary_type']  # Add secondary type
-                },
-                "image_path": str(pokemon['image_path']) if pokemon.get('image_path') else None
-            })
+        user_records = stats_store.sample(7)
 
         # Randomly select 3 Pokémon for the CPU (overlap with user Pokémon is allowed)
-        cpu_pokemon_ids = random.sample(pokemon_ids, 3)
-        cpu_pokemon = []
-        for pid in cpu_pokemon_ids:
-            pokemon = next(p for p in all_pokemon if p['pokemon']['pokemonId'] == pid)
-            cpu_pokemon.append({
-                "_id": str(pokemon['_id']),
-                "pokemon": {
-                    "pokemonId": pokemon['pokemon']['pokemonId'],
-                    "name": pokemon['pokemon']['name'],
-                    "hp": pokemon['pokemon']['hp'],
-                    "attack": pokemon['pokemon']['attack'],
-                    "defense": pokemon['pokemon']['defense'],
-                    "speed": pokemon['pokemon']['speed'],
-                    "height": pokemon['pokemon']['height'],
-                    "weight": pokemon['pokemon']['weight'],
-                    "capture_rate": pokemon['pokemon']['capture_rate'],
-                    "primary_type": pokemon['pokemon']['primary_type'],  # Add primary type
-                    "secondary_type": pokemon['pokemon']['secondary_type']  # Add secondary type
-                },
-                "image_path": str(pokemon['image_path']) if pokemon.get('image_path') else None
-            })
+        cpu_team = [_battle_member(record) for record in stats_store.sample(TEAM_SIZE)]
+
+        # The battle state lives on the server from here on
+        session = {
+            "userChoices": [record.pokemon_id for record in user_records],
+            "userTeam": [],
+            "cpuTeam": cpu_team,
+            "currentTurn": 1,
+            "gameOver": False,
+            "winner": None,
+            "updated": datetime.utcnow()
+        }
+        session_id = mongo.db.BattleSessions.insert_one(session).inserted_id
 
         return jsonify({
-            "userPokemon": user_pokemon,
-            "cpuPokemon": cpu_pokemon
+            "sessionId": session_id,
+            "userPokemon": [record.to_dict() for record in user_records],
+            "cpuPokemon": [_battle_card(member) for member in cpu_team]
         }), 200
 
     except Exception as e:
         logging.error(f"Error in start_game: {str(e)}")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+@game_bp.route('/api/game/select', methods=['POST'])
+def select_team():
+    try:
+        data = request.get_json()
+        if not data:
+            logging.debug("No data provided in select_team request.")
+            return jsonify({"error": "No data provided."}), 400
+
+        session = _load_session(data)
+        if not session:
+            return jsonify({"error": "Battle session not found or expired."}), 404
+        if session['userTeam']:
+            return jsonify({"error": "Team has already been selected."}), 409
+
+        # Selected Pokémon are identified by their _id and must come from this session's choices
+        choices = {}
+        for pokemon_id in session['userChoices']:
+            record = stats_store.get(pokemon_id)
+            if record:
+                choices[record._id] = record
+        selected = data.get('selected', [])
+        if len(set(selected)) != TEAM_SIZE or any(s not in choices for s in selected):
+            return jsonify({"error": f"Select exactly {TEAM_SIZE} of the offered Pokémon."}), 400
+
+        user_team = [_battle_member(choices[s]) for s in selected]
+        mongo.db.BattleSessions.update_one(
+            {"_id": session['_id']},
+            {"$set": {"userTeam": user_team, "updated": datetime.utcnow()}}
+        )
+
+        return jsonify({
+            "userTeam": [_battle_card(member) for member in user_team],
+            "cpuTeam": [_battle_card(member) for member in session['cpuTeam']],
+            "currentTurn": session['currentTurn']
+        }), 200
+
+    except Exception as e:
+        logging.error(f"Error in select_team: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 @game_bp.route('/api/game/turn', methods=['POST'])
 def process_turn():
     try:
@@ -89,83 +160,59 @@ def process_turn():
             logging.debug("No data provided in process_turn request.")
             return jsonify({"error": "No data provided."}), 400
 
-        # Extract battle state
-        user_team = data.get('userTeam', [])
-        cpu_team = data.get('cpuTeam', [])
-        current_turn = data.get('currentTurn', 1)
+        if data.get('action', 'attack') != 'attack':
+            return jsonify({"error": "Unknown action."}), 400
 
-        # Check if the game has already ended
-        user_alive = any(p['health'] > 0 for p in user_team)
-        cpu_alive = any(p['health'] > 0 for p in cpu_team)
+        # Load the battle state from the session instead of trusting the client
+        session = _load_session(data)
+        if not session:
+            return jsonify({"error": "Battle session not found or expired."}), 404
+        if not session['userTeam']:
+            return jsonify({"error": "Select a team before starting the battle."}), 400
+
+        user_team = session['userTeam']
+        cpu_team = session['cpuTeam']
+        current_turn = session['currentTurn']
 
-        if not user_alive or not cpu_alive:
-            winner = "CPU" if user_alive else "User" if cpu_alive else "Draw"
+        # Check if the game has already ended
+        if session['gameOver']:
             return jsonify({
-                "userTeam": user_team,
-                "cpuTeam": cpu_team,
                 "currentTurn": current_turn,
+                "changes": [],
                 "battleLog": ["Game has already ended."],
                 "gameOver": True,
-                "winner": winner
+                "winner": session['winner']
             }), 200
 
         # Check for maximum turns (10 turns)
-        if current_turn > 10:
-            user_total_health = sum(p['health'] for p in user_team if p['health'] > 0)
-            cpu_total_health = sum(p['health'] for p in cpu_team if p['health'] > 0)
-            winner = "User" if user_total_health > cpu_total_health else "CPU" if cpu_total_health > user_total_health else "Draw"
-            return jsonify({
+        if current_turn > MAX_TURNS:
+            winner = winner_by_health(user_team, cpu_team)
+            battle_log = ["Maximum turns reached. Determining winner by remaining health."]
+            changes = []
+            game_over = True
+            next_turn = current_turn
+        else:
+            battle_log, changes, game_over, winner = play_turn(user_team, cpu_team, current_turn)
+            next_turn = current_turn + 1
+
+        # Only apply the turn if no other request advanced this session meanwhile
+        result = mongo.db.BattleSessions.update_one(
+            {"_id": session['_id'], "currentTurn": current_turn, "gameOver": False},
+            {"$set": {
                 "userTeam": user_team,
                 "cpuTeam": cpu_team,
-                "currentTurn": current_turn,
-                "battleLog": ["Maximum turns reached. Determining winner by remaining health."],
-                "gameOver": True,
-                "winner": winner
-            }), 200
-
-        battle_log = []
-
-        # User's turn to attack
-        user_alive_pokemon = [p for p in user_team if p['health'] > 0]  # Only alive Pokémon contribute to attack
-        if user_alive_pokemon:
-            user_combined_attack = sum(p['attackPower'] for p in user_alive_pokemon)
-            user_attack_per_pokemon = user_combined_attack / len(user_alive_pokemon)
-            battle_log.append(f"Turn {current_turn}: User's team deals {user_attack_per_pokemon:.2f} damage to all CPU Pokémon.")
-
-            for cpu_pokemon in cpu_team:
-                if cpu_pokemon['health'] > 0:
-                    cpu_pokemon['health'] -= user_attack_per_pokemon
-                    if cpu_pokemon['health'] <= 0:
-                        cpu_pokemon['health'] = 0
-                        battle_log.append(f"CPU's {cpu_pokemon['pokemon']['name']} faints.")
-
-        # CPU's turn to attack
-        cpu_alive_pokemon = [p for p in cpu_team if p['health'] > 0]  # Only alive Pokémon contribute to attack
-        if cpu_alive_pokemon:
-            cpu_combined_attack = sum(p['attackPower'] for p in cpu_alive_pokemon)
-            cpu_attack_per_pokemon = cpu_combined_attack / len(cpu_alive_pokemon)
-            battle_log.append(f"Turn {current_turn}: CPU's team deals {cpu_attack_per_pokemon:.2f} damage to all User Pokémon.")
-
-            for user_pokemon in user_team:
-                if user_pokemon['health'] > 0:
-                    user_pokemon['health'] -= cpu_attack_per_pokemon
-                    if user_pokemon['health'] <= 0:
-                        user_pokemon['health'] = 0
-                        battle_log.append(f"User's {user_pokemon['pokemon']['name']} faints.")
-
-        # Check if the game is over
-        user_alive = any(p['health'] > 0 for p in user_team)
-        cpu_alive = any(p['health'] > 0 for p in cpu_team)
-        game_over = not (user_alive and cpu_alive)
-        winner = None
-        if game_over:
-            winner = "User" if user_alive else "CPU" if cpu_alive else "Draw"
-            battle_log.append(f"Game Over! {winner} wins!")
+                "currentTurn": next_turn,
+                "gameOver": game_over,
+                "winner": winner,
+                "updated": datetime.utcnow()
+            }}
+        )
+        if result.modified_count == 0:
+            return jsonify({"error": "This turn has already been played."}), 409
 
         return jsonify({
-            "userTeam": user_team,
-            "cpuTeam": cpu_team,
-            "currentTurn": current_turn + 1,
+            "currentTurn": next_turn,
+            "changes": changes,
             "battleLog": battle_log,
             "gameOver": game_over,
             "winner": winner
@@ -173,4 +220,48 @@ def process_turn():
 
     except Exception as e:
         logging.error(f"Error in process_turn: {str(e)}")
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@game_bp.route('/api/game/simulate', methods=['POST'])
+def simulate_battles():
+    try:
+        # Monte Carlo balance check: teams are lists of pokemonIds, an omitted team is drawn at random per battle
+        data = request.get_json(silent=True) or {}
+        user_ids = [str(pid) for pid in data.get('userTeam') or []]
+        cpu_ids = [str(pid) for pid in data.get('cpuTeam') or []]
+        battles = int(data.get('battles', 1000))
+        max_turns = int(data.get('maxTurns', MAX_TURNS))
+
+        if not 0 < battles <= Config.BATTLE_SIM_MAX_BATTLES:
+            return jsonify({"error": f"battles must be between 1 and {Config.BATTLE_SIM_MAX_BATTLES}"}), 400
+        if max_turns <= 0:
+            return jsonify({"error": "maxTurns must be a positive integer"}), 400
+
+        records = stats_store.records()
+        if len(records) < TEAM_SIZE:
+            return jsonify({"error": "Not enough Pokémon in the database to simulate battles."}), 404
+        for team_ids in (user_ids, cpu_ids):
+            if team_ids and len(team_ids) != TEAM_SIZE:
+                return jsonify({"error": f"Teams must have exactly {TEAM_SIZE} Pokémon."}), 400
+            unknown = [pid for pid in team_ids if stats_store.get(pid) is None]
+            if unknown:
+                return jsonify({"error": f"Unknown Pokémon IDs: {', '.join(unknown)}"}), 400
+
+        rng = np.random.default_rng(data.get('seed'))
+        user_health, user_power = _team_arrays(user_ids, records, battles, rng)
+        cpu_health, cpu_power = _team_arrays(cpu_ids, records, battles, rng)
+
+        outcome, turns, by_health = simulate_sharded(
+            user_health, user_power, cpu_health, cpu_power,
+            max_turns=max_turns, workers=Config.BATTLE_SIM_WORKERS
+        )
+
+        result = summarize(outcome, turns, by_health)
+        result.update(userTeam=user_ids or None, cpuTeam=cpu_ids or None, maxTurns=max_turns)
+        return jsonify(result), 200
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid simulation parameters: {str(e)}"}), 400
+    except Exception as e:
+        logging.error(f"Error in simulate_battles: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
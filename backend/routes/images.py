@@ -1,31 +1,230 @@
-from flask import Blueprint, send_file, jsonify
-from io import BytesIO
-from pymongo import MongoClient
+from flask import Blueprint, Response, jsonify, request
+from gridfs import GridOut
+from gridfs.errors import NoFile
 from config import Config
-from gridfs import GridFS
+from extensions import mongo
+from utils.cache import ByteLRUCache
 import bson
+import hashlib
+import json
+import struct
 
 images_bp = Blueprint('images', __name__)
 
-# MongoDB connection with authentication
-client = MongoClient(Config.MONGO_URI)
-db = client['PokeMap']
-fs = GridFS(db, collection='images')
+# Formats pokemon_script.py stores; PNG is the original's and always available
+IMAGE_MIMETYPES = {'png': 'image/png', 'webp': 'image/webp', 'avif': 'image/avif'}
+
+# Hot images kept in memory as (bytes, etag, mimetype, vary), bounded by total size
+image_cache = ByteLRUCache(Config.IMAGE_CACHE_MAX_BYTES)
+
+# Multi-image payloads as (bytes, etag), keyed by the sorted file ids
+batch_cache = ByteLRUCache(Config.IMAGE_CACHE_MAX_BYTES)
+
+
+def _image_etag(file_doc):
+    # GridFS files are never modified in place, so the md5 (when present) or the _id is a strong validator
+    return file_doc.get('md5') or str(file_doc['_id'])
+
+
+def _image_size(file_doc):
+    # Longest side in pixels; originals uploaded before derivatives existed have none and count as largest
+    return (file_doc.get('metadata') or {}).get('size') or float('inf')
+
+
+def _image_format(file_doc):
+    return (file_doc.get('metadata') or {}).get('format', 'png')
+
+
+def _requested_variant(args, accept_mimetypes):
+    # (size, formats, negotiated) from the size/format parameters and the Accept header.
+    # Raises ValueError for an invalid size or format.
+    size = args.get('size', type=int)
+    image_format = args.get('format', '').strip().lower()
+    if size is not None and size <= 0:
+        raise ValueError("size must be a positive integer")
+    if image_format and image_format not in IMAGE_MIMETYPES:
+        raise ValueError(f"format must be one of {', '.join(IMAGE_MIMETYPES)}")
+    if image_format:
+        return size, {image_format}, False
+    # Only formats the client names explicitly; */* is sent by browsers that can't decode AVIF or WebP
+    accepted = {value for value, quality in accept_mimetypes if quality > 0}
+    return size, {f for f, mimetype in IMAGE_MIMETYPES.items() if mimetype in accepted} | {'png'}, True
+
+
+def _variant_query(image_ids):
+    # The originals and all their derivatives in one query
+    return {"$or": [{"_id": {"$in": image_ids}}, {"metadata.source": {"$in": image_ids}}]}
+
+
+def _group_variants(file_docs):
+    # {original _id: [original, derivatives...]}; derivatives without their original are dropped
+    variants = {f['_id']: [f] for f in file_docs if 'source' not in (f.get('metadata') or {})}
+    for file_doc in file_docs:
+        source = (file_doc.get('metadata') or {}).get('source')
+        if source in variants:
+            variants[source].append(file_doc)
+    return variants
+
+
+def _pick_variant(file_docs, size, formats):
+    # The smallest stored size covering the requested one (the largest without a size), then the
+    # smallest file among the acceptable formats at that size. PNG at that size is the fallback
+    # for a format that wasn't generated, and the original (first) when nothing else fits.
+    sizes = sorted({_image_size(f) for f in file_docs})
+    target = sizes[-1] if size is None else next((s for s in sizes if s >= size), sizes[-1])
+    at_size = [f for f in file_docs if _image_size(f) == target]
+    candidates = [f for f in at_size if _image_format(f) in formats] or [f for f in at_size if _image_format(f) == 'png']
+    if not candidates:
+        return file_docs[0]
+    return min(candidates, key=lambda f: f['length'])
+
+
+def _image_response(body, etag, mimetype, length, vary=False):
+    response = Response(body, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = length
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = Config.IMAGE_CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    if vary:
+        # The format was chosen from the Accept header, so shared caches must key on it
+        response.vary.add('Accept')
+    # Turns the response into a 304 when If-None-Match matches the ETag
+    return response.make_conditional(request)
+
+
+def _chunks(image):
+    # Iterating a GridOut yields lines, i.e. binary data cut at every b'\n'; readchunk()
+    # returns one stored chunk at a time and an empty string at the end of the file
+    while True:
+        chunk = image.readchunk()
+        if not chunk:
+            return
+        yield chunk
+
+
+def _split_param(name):
+    return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+
+
+def _build_batch(files):
+    # Two queries in total: the file documents were fetched with $in, now all their chunks.
+    # files maps each original's _id to the file document (original or derivative) to send.
+    # The payload is a 4-byte big-endian length, that many bytes of JSON mapping each id to
+    # its byte range, then the images back to back.
+    files_by_id = {f['_id']: f for f in files.values()}
+    chunks_by_file = {file_id: [] for file_id in files_by_id}
+    chunks = mongo.db['images.chunks'].find(
+        {"files_id": {"$in": list(files_by_id)}},
+        {"files_id": 1, "n": 1, "data": 1}
+    ).sort([("files_id", 1), ("n", 1)])
+    for chunk in chunks:
+        chunks_by_file[chunk['files_id']].append(chunk['data'])
+
+    parts = []
+    offsets = {}
+    position = 0
+    for original_id in sorted(files):
+        file_doc = files[original_id]
+        data = b''.join(chunks_by_file[file_doc['_id']])
+        offsets[str(original_id)] = {
+            "offset": position,
+            "length": len(data),
+            "pokemonId": (file_doc.get('metadata') or {}).get('pokemon_id'),
+            "contentType": IMAGE_MIMETYPES[_image_format(file_doc)]
+        }
+        parts.append(data)
+        position += len(data)
+    preamble = json.dumps(offsets, separators=(',', ':')).encode()
+    return struct.pack('>I', len(preamble)) + preamble + b''.join(parts)
+
+
+@images_bp.route('/api/images/batch', methods=['GET'])
+def get_image_batch():
+    try:
+        # Either GridFS file ids or Pokémon ids, comma separated, with the same size/format options as get_image
+        image_ids = [bson.ObjectId(i) for i in _split_param('ids')]
+        pokemon_ids = _split_param('pokemonIds')
+        if not image_ids and not pokemon_ids:
+            return jsonify({"error": "ids or pokemonIds is required"}), 400
+        if len(image_ids) + len(pokemon_ids) > Config.IMAGE_BATCH_MAX_IDS:
+            return jsonify({"error": f"At most {Config.IMAGE_BATCH_MAX_IDS} images per request"}), 400
+        try:
+            size, formats, negotiated = _requested_variant(request.args, request.accept_mimetypes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Derivatives carry their Pokémon id too, so the pokemonIds branch returns them along with the originals
+        query = _variant_query(image_ids)
+        if pokemon_ids:
+            query["$or"].append({"metadata.pokemon_id": {"$in": pokemon_ids}})
+        variants = _group_variants(list(mongo.db['images.files'].find(query, {"_id": 1, "length": 1, "metadata": 1})))
+        if not variants:
+            return jsonify({"error": "No images found"}), 404
+
+        files = {original_id: _pick_variant(docs, size, formats) for original_id, docs in variants.items()}
+        key = tuple(sorted((original_id, f['_id']) for original_id, f in files.items()))
+        cached = batch_cache.get(key)
+        if cached:
+            data, etag = cached
+        else:
+            data = _build_batch(files)
+            # File contents never change for a given _id, so the id set identifies the payload
+            etag = hashlib.sha1(','.join(str(file_id) for _, file_id in key).encode()).hexdigest()
+            batch_cache.set(key, (data, etag), len(data))
+
+        response = Response(data, mimetype='application/octet-stream')
+        if negotiated:
+            response.vary.add('Accept')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.IMAGE_CACHE_MAX_AGE
+        return response.make_conditional(request)
+    except bson.errors.InvalidId as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 
 @images_bp.route('/api/images/<image_id>', methods=['GET'])
 def get_image(image_id):
     try:
         # Convert the image_id string to ObjectId
         image_id = bson.ObjectId(image_id)
-        # Retrieve the image from GridFS
-        image = fs.get(image_id)
-        # Serve the image
-        return send_file(
-            BytesIO(image.read()),
-            mimetype='image/png',
-            as_attachment=False
-        )
-    except (bson.errors.InvalidId, gridfs.errors.NoFile) as e:
+        try:
+            size, formats, negotiated = _requested_variant(request.args, request.accept_mimetypes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Serve hot images (and their 304s) without touching MongoDB
+        key = (image_id, size, frozenset(formats))
+        cached = image_cache.get(key)
+        if cached:
+            data, etag, mimetype, vary = cached
+            return _image_response(data, etag, mimetype, len(data), vary)
+
+        # The original and its derivatives in one query; only the chosen file's chunks are read below
+        variants = sorted(mongo.db['images.files'].find(_variant_query([image_id])), key=lambda f: f['_id'] != image_id)
+        if not variants or variants[0]['_id'] != image_id:
+            raise NoFile(f"Image {image_id} not found")
+        file_doc = _pick_variant(variants, size, formats)
+        etag = _image_etag(file_doc)
+        mimetype = IMAGE_MIMETYPES[_image_format(file_doc)]
+        # Vary only matters when more than one format could have been sent
+        vary = negotiated and len(variants) > 1
+
+        if request.if_none_match.contains(etag):
+            return _image_response(b'', etag, mimetype, 0, vary)
+
+        image = GridOut(mongo.db.images, file_document=file_doc)
+        if image.length <= Config.IMAGE_CACHE_MAX_ITEM_BYTES:
+            data = image.read()
+            image_cache.set(key, (data, etag, mimetype, vary), len(data))
+            return _image_response(data, etag, mimetype, len(data), vary)
+
+        # Large files are streamed chunk by chunk instead of being buffered
+        return _image_response(_chunks(image), etag, mimetype, image.length, vary)
+    except (bson.errors.InvalidId, NoFile) as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
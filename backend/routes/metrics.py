@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from utils.metrics import registry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text exposition format, scraped per worker process
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
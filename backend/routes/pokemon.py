@@ -1,156 +1,507 @@
 from flask import Blueprint, jsonify, request
-from pymongo import MongoClient
+from bson import ObjectId
 from config import Config
-from datetime import datetime
+from extensions import mongo
+from models.indexes import SORT_OPTIONS
+from models.sighting_index import sighting_index
+from models.stats_store import stats_store
+from utils.cache import TTLCache
+from utils.json_provider import stream_json_array
+from utils.response_cache import POKEDEX_KEYS, VERSION_KEYS, cached_response, data_version
+from datetime import date, datetime, timedelta
+import base64
+import json
 import logging
+import re
 
 pokemon_bp = Blueprint('pokemon', __name__)
 
-# MongoDB connection with authentication
-client = MongoClient(Config.MONGO_URI)
-db = client['PokeMap']
-merged_collection = db['MergedPokemonSightings']
+# Longest name n-gram written by pokemon_script.py into search.name_grams
+NAME_GRAM_SIZE = 3
 
-# Ensure geospatial index on sightings.location
-merged_collection.create_index([("sightings.location", "2dsphere")])
+# Sighting clusters: deepest supported zoom and grid cells per side of a 256px map tile
+MAX_CLUSTER_ZOOM = 22
+CLUSTER_CELLS_PER_TILE = 4
+
+# Comments page size when perPage is not given, and the largest page served
+COMMENTS_PER_PAGE = 20
+MAX_COMMENTS_PER_PAGE = 100
+
+# Geohash cells of the sighting rollups; must match GEOHASH_PRECISION in pokemon_script.py
+GEOHASH_PRECISION = 3
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Sightings returned by /sightings/nearby when limit is not given, and the most it returns
+NEARBY_LIMIT = 500
+MAX_NEARBY_LIMIT = 5000
+
+# Facets: value counts per filter field, histograms per numeric field and their
+# default/largest number of buckets
+TERM_FACETS = {
+    'primaryTypes': ('search.primary_type', '$pokemon.primary_type'),
+    'secondaryTypes': ('search.secondary_type', '$pokemon.secondary_type'),
+    'legendary': ('pokemon.legendary', '$pokemon.legendary')
+}
+RANGE_FACETS = {
+    'height': 'pokemon.height',
+    'weight': 'pokemon.weight',
+    'captureRate': 'pokemon.capture_rate'
+}
+FACET_BUCKETS = 10
+MAX_FACET_BUCKETS = 50
+
+# Counts per data version and normalized filter
+count_cache = TTLCache(Config.COUNT_CACHE_TTL)
+
+# Sightings are only returned when explicitly requested, comments through their own endpoint
+POKEMON_PROJECTION = {'sightings': 0, 'comments': 0, 'search': 0, 'source_hash': 0}
+
+# Fields returned for each sighting point
+SIGHTING_PROJECTION = {"_id": 0, "location": 1, "date": 1}
+
+# Fields needed to render a Pokédex card; sightings and comments never leave the server
+CARD_FIELDS = [
+    'pokemon.pokemonId', 'pokemon.name', 'pokemon.primary_type', 'pokemon.secondary_type',
+    'pokemon.hp', 'pokemon.attack', 'pokemon.defense', 'pokemon.speed',
+    'pokemon.height', 'pokemon.weight', 'pokemon.capture_rate', 'pokemon.legendary',
+    'image_path', 'sightings_count'
+]
+
+
+def _include_sightings(args):
+    return args.get('includeSightings', '').strip().lower() == 'true'
+
+
+def _build_projection(args):
+    # Turn the view=card|full and fields= parameters into a MongoDB projection
+    view = args.get('view', 'full').strip().lower()
+    fields = [f.strip() for f in args.get('fields', '').split(',') if f.strip()]
+    card = view == 'card'
+
+    if card:
+        fields = [f for f in fields if f in CARD_FIELDS] or CARD_FIELDS
+    if not fields:
+        return POKEMON_PROJECTION, card
+
+    projection = {f: 1 for f in fields if not f.startswith('$') and f not in ('sightings', 'comments')}
+    if 'pokemon' not in projection:
+        projection['pokemon.pokemonId'] = 1  # Needed to attach sightings and as a stable key
+    return projection, card
+
+
+def _version_keys(args):
+    # Only the full view (or fields asking for it) includes comments_count, so only those
+    # responses change with every new comment
+    projection, card = _build_projection(args)
+    if card or (projection is not POKEMON_PROJECTION and 'comments_count' not in projection):
+        return POKEDEX_KEYS
+    return VERSION_KEYS
+
+
+def _name_filter(search_term):
+    # Substring match on the name through the n-gram index instead of an unanchored regex
+    term = search_term.lower()
+    if len(term) <= NAME_GRAM_SIZE:
+        return {'search.name_grams': term}
+    grams = [term[i:i + NAME_GRAM_SIZE] for i in range(len(term) - NAME_GRAM_SIZE + 1)]
+    return {
+        'search.name_grams': {'$all': grams},
+        'search.name': {'$regex': re.escape(term)}
+    }
+
+
+def _count_key(query, version):
+    # Counts only change with the ETL, so they are keyed by its 'pokedex' version
+    return version + '|' + json.dumps(query, sort_keys=True, default=str)
+
+
+def _count_pokemon(query):
+    key = _count_key(query, data_version.current(POKEDEX_KEYS))
+    total = count_cache.get(key)
+    if total is None:
+        total = mongo.db.MergedPokemonSightings.count_documents(query)
+        count_cache.set(key, total)
+    return total
+
+
+def _get_field(document, path):
+    for part in path.split('.'):
+        document = document.get(part) if isinstance(document, dict) else None
+    return document
+
+
+def _encode_cursor(document, sort_field):
+    # Opaque token holding the sort key and _id of the last document on the page
+    payload = {"f": sort_field, "v": _get_field(document, sort_field), "id": str(document['_id'])}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def _decode_cursor(cursor, sort_field, sort_direction):
+    # Build the keyset filter that resumes strictly after the cursor position
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        last_id = ObjectId(payload['id'])
+        last_value = payload['v']
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if payload.get('f') != sort_field:
+        raise ValueError("Cursor does not match the requested sortOption")
+
+    op = '$gt' if sort_direction == 1 else '$lt'
+    return {'$or': [
+        {sort_field: {op: last_value}},
+        {sort_field: last_value, '_id': {op: last_id}}
+    ]}
+
+
+def _encode_comment_cursor(comment):
+    # Comments are paged newest first on (date, _id)
+    payload = {"d": comment['date'].isoformat(), "id": str(comment['_id'])}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def _decode_comment_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        last_date = datetime.fromisoformat(payload['d'])
+        last_id = ObjectId(payload['id'])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return {'$or': [
+        {'date': {'$lt': last_date}},
+        {'date': last_date, '_id': {'$lt': last_id}}
+    ]}
+
+
+def _load_sightings(pokemon_ids):
+    # Fetch the buckets for all requested Pokémon in a single query
+    sightings_by_pokemon = {pokemon_id: [] for pokemon_id in pokemon_ids}
+    buckets = mongo.db.PokemonSightingBuckets.find(
+        {"pokemonId": {"$in": list(pokemon_ids)}},
+        {"_id": 0, "pokemonId": 1, "sightings": 1}
+    ).sort([("pokemonId", 1), ("period", 1), ("cell", 1)])
+    for bucket in buckets:
+        sightings_by_pokemon[bucket['pokemonId']].extend(bucket['sightings'])
+    return sightings_by_pokemon
+
+
+def _filter_query(args):
+    # MongoDB filter for the Pokédex filter parameters, shared by the list and facets routes
+    search_term = args.get('searchTerm', '').strip()
+    primary_type = args.get('primaryType', '').strip()
+    secondary_type = args.get('secondaryType', '').strip()
+    min_height = args.get('minHeight', type=float)
+    max_height = args.get('maxHeight', type=float)
+    min_weight = args.get('minWeight', type=float)
+    max_weight = args.get('maxWeight', type=float)
+    min_capture_rate = args.get('minCaptureRate', type=int)
+    max_capture_rate = args.get('maxCaptureRate', type=int)
+    legendary = args.get('legendary', '').strip().lower()
+
+    # Build the MongoDB query
+    query = {}
+
+    if search_term:
+        query.update(_name_filter(search_term))
+    if primary_type:
+        query['search.primary_type'] = primary_type.lower()
+    if secondary_type:
+        query['search.secondary_type'] = secondary_type.lower()
+    if min_height is not None or max_height is not None:
+        height_query = {}
+        if min_height is not None:
+            height_query['$gte'] = min_height
+        if max_height is not None:
+            height_query['$lte'] = max_height
+        query['pokemon.height'] = height_query
+    if min_weight is not None or max_weight is not None:
+        weight_query = {}
+        if min_weight is not None:
+            weight_query['$gte'] = min_weight
+        if max_weight is not None:
+            weight_query['$lte'] = max_weight
+        query['pokemon.weight'] = weight_query
+    if min_capture_rate is not None or max_capture_rate is not None:
+        capture_rate_query = {}
+        if min_capture_rate is not None:
+            capture_rate_query['$gte'] = min_capture_rate
+        if max_capture_rate is not None:
+            capture_rate_query['$lte'] = max_capture_rate
+        query['pokemon.capture_rate'] = capture_rate_query
+    if legendary in ['true', 'false']:
+        query['pokemon.legendary'] = legendary == 'true'
+
+    return query
+
+
+def _list_plan(args):
+    # Everything get_all_pokemon needs from its query string: the filter, sort, page
+    # and projection. Shared by the WSGI and async routes; raises ValueError for a bad cursor
+    sort_option = args.get('sortOption', 'No.').strip()
+    page = args.get('page', 1, type=int)
+    per_page = args.get('perPage', type=int)  # Optional
+    cursor = args.get('cursor', '').strip()  # Optional, from a previous nextCursor
+    projection, card = _build_projection(args)
+    include_sightings = _include_sightings(args) and not card
+    query = _filter_query(args)
+
+    # Sorting
+    sort_field, sort_direction = SORT_OPTIONS.get(sort_option, SORT_OPTIONS['No.'])
+
+    find_query = query
+    skip = 0
+    if per_page and cursor:
+        keyset = _decode_cursor(cursor, sort_field, sort_direction)
+        find_query = {'$and': [query, keyset]} if query else keyset
+    elif per_page:
+        skip = (page - 1) * per_page
+
+    # The sort key has to come back with each document to build the next cursor
+    if 1 in projection.values() and 'pokemon' not in projection:
+        projection[sort_field] = 1
+
+    return {
+        'query': query,
+        'find_query': find_query,
+        'projection': projection,
+        'sort': [(sort_field, sort_direction), ('_id', sort_direction)],
+        'sort_field': sort_field,
+        'skip': skip,
+        'limit': per_page or 0,
+        'page': page,
+        'per_page': per_page,
+        'include_sightings': include_sightings
+    }
+
+
+def _list_response(plan, pokemon_data, total_pokemon):
+    per_page = plan['per_page']
+    next_cursor = None
+    if per_page and len(pokemon_data) == per_page:
+        next_cursor = _encode_cursor(pokemon_data[-1], plan['sort_field'])
+    return {
+        'pokemon': pokemon_data,
+        'totalPokemon': total_pokemon,
+        'totalPages': (total_pokemon + per_page - 1) // per_page if per_page else 1,
+        'currentPage': plan['page'],
+        'nextCursor': next_cursor
+    }
+
+
+def _end_date_filter(end_date):
+    # Dates are compared as ISO 8601 strings, where '2016-09-02T10:00:00' > '2016-09-02', so a
+    # date-only endDate would drop its own day; it includes the whole day up to the next one
+    if len(end_date) == 10:
+        try:
+            return {'$lt': (date.fromisoformat(end_date) + timedelta(days=1)).isoformat()}
+        except ValueError:
+            pass
+    return {'$lte': end_date}
+
+
+def _sightings_plan(args, pokemon_id):
+    # Query (or $geoNear pipeline when a center is given) for get_sightings_by_area,
+    # shared by the WSGI and async routes; raises ValueError for an invalid limit
+    latitude = args.get('latitude', type=float)
+    longitude = args.get('longitude', type=float)
+    radius = args.get('radius', 10, type=float)
+    start_date = args.get('startDate', '').strip()  # Optional, ISO 8601
+    end_date = args.get('endDate', '').strip()  # Optional, ISO 8601
+    limit = args.get('limit', type=int)  # Optional
+
+    if limit is not None and limit <= 0:
+        raise ValueError("limit must be a positive integer")
+
+    query = {"pokemonId": pokemon_id}  # String match
+    if start_date or end_date:
+        date_query = {}
+        if start_date:
+            date_query['$gte'] = start_date
+        if end_date:
+            date_query.update(_end_date_filter(end_date))
+        query['date'] = date_query
+
+    if latitude is None or longitude is None:
+        return {'query': query, 'limit': limit}
+
+    # $geoNear walks the (pokemonId, location, date) index outwards from the center,
+    # so results come back nearest first and stop at the radius or the limit
+    pipeline = [
+        {
+            "$geoNear": {
+                "near": {"type": "Point", "coordinates": [longitude, latitude]},  # [lng, lat] order for MongoDB
+                "key": "location",
+                "distanceField": "distance",
+                "maxDistance": radius * 1000,  # Radius is in km, distances in meters
+                "query": query,
+                "spherical": True
+            }
+        }
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({
+        "$project": {
+            "_id": 0,
+            "location": 1,
+            "date": 1,
+            "distance": {"$divide": ["$distance", 1000]}
+        }
+    })
+    return {'pipeline': pipeline}
+
+
+def _facets_pipeline(query, buckets):
+    # One $facet aggregation for every facet. Each facet applies all current filters
+    # except its own, so the UI can show the other values it could switch to; the
+    # name filter is shared by all of them and applied once, through its index.
+    facet_keys = {key for key, _ in TERM_FACETS.values()} | set(RANGE_FACETS.values())
+    shared = {key: value for key, value in query.items() if key not in facet_keys}
+
+    def match(excluded=None):
+        return {key: value for key, value in query.items() if key in facet_keys and key != excluded}
+
+    facets = {'total': [{"$match": match()}, {"$count": "count"}]}
+    for name, (filter_key, value) in TERM_FACETS.items():
+        facets[name] = [
+            {"$match": match(filter_key)},
+            {"$group": {"_id": value, "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ]
+    for name, field in RANGE_FACETS.items():
+        facets[name] = [
+            {"$match": {**match(field), field: {"$type": "number"}}},
+            {"$bucketAuto": {"groupBy": f"${field}", "buckets": buckets}}
+        ]
+
+    pipeline = [{"$match": shared}] if shared else []
+    pipeline.append({"$facet": facets})
+    return pipeline
+
+
+def _facets_response(result):
+    total = result['total'][0]['count'] if result['total'] else 0
+    response = {'totalPokemon': total}
+    for name in TERM_FACETS:
+        # Pokémon without a secondary type are left out of its counts
+        response[name] = [
+            {'value': entry['_id'], 'count': entry['count']}
+            for entry in result[name] if entry['_id'] not in (None, '')
+        ]
+    for name in RANGE_FACETS:
+        histogram = [
+            {'min': entry['_id']['min'], 'max': entry['_id']['max'], 'count': entry['count']}
+            for entry in result[name]
+        ]
+        # Each bucket includes its min and excludes its max, except the last which includes both
+        response[name] = {
+            'min': histogram[0]['min'] if histogram else None,
+            'max': histogram[-1]['max'] if histogram else None,
+            'buckets': histogram
+        }
+    return response
+
+
+def _facet_buckets(args):
+    buckets = args.get('buckets', FACET_BUCKETS, type=int)
+    if buckets <= 0 or buckets > MAX_FACET_BUCKETS:
+        raise ValueError(f"buckets must be between 1 and {MAX_FACET_BUCKETS}")
+    return buckets
+
+
+def _rollup_query(args, pokemon_id=None):
+    # Collection and filter for the rollup routes. Rollups are per day, so startDate and
+    # endDate select whole days; a cell (geohash prefix) switches to the per-cell rollups.
+    # Raises ValueError for an invalid cell.
+    start_date = args.get('startDate', '').strip()[:10]  # Optional, ISO 8601
+    end_date = args.get('endDate', '').strip()[:10]  # Optional, ISO 8601
+    cell = args.get('cell', '').strip().lower()  # Optional
+
+    if cell and (len(cell) > GEOHASH_PRECISION or any(c not in GEOHASH_BASE32 for c in cell)):
+        raise ValueError(f"cell must be a geohash of at most {GEOHASH_PRECISION} characters")
+
+    query = {}
+    if pokemon_id is not None:
+        query['pokemonId'] = pokemon_id  # String match
+    if start_date or end_date:
+        day_query = {}
+        if start_date:
+            day_query['$gte'] = start_date
+        if end_date:
+            day_query['$lte'] = end_date
+        query['day'] = day_query
+    if not cell:
+        return mongo.db.SightingRollups, query
+
+    # A full-length cell is an exact match, a shorter one an anchored prefix on the same index
+    query['cell'] = cell if len(cell) == GEOHASH_PRECISION else {'$regex': f"^{cell}"}
+    return mongo.db.SightingRollupsByCell, query
 
 @pokemon_bp.route('/pokemon', methods=['GET'])
+@cached_response(_version_keys)
 def get_all_pokemon():
     try:
-        # Extract query parameters
-        search_term = request.args.get('searchTerm', '').strip()
-        primary_type = request.args.get('primaryType', '').strip()
-        secondary_type = request.args.get('secondaryType', '').strip()
-        min_height = request.args.get('minHeight', type=float)
-        max_height = request.args.get('maxHeight', type=float)
-        min_weight = request.args.get('minWeight', type=float)
-        max_weight = request.args.get('maxWeight', type=float)
-        min_capture_rate = request.args.get('minCaptureRate', type=int)
-        max_capture_rate = request.args.get('maxCaptureRate', type=int)
-        legendary = request.args.get('legendary', '').strip().lower()
-        sort_option = request.args.get('sortOption', 'No.').strip()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('perPage', type=int)  # Optional
-
-        # Build the MongoDB query
-        query = {}
-
-        if search_term:
-            query['pokemon.name'] = {'$regex': search_term, '$options': 'i'}
-        if primary_type:
-            query['pokemon.primary_type'] = {'$regex': f'^{primary_type}$', '$options': 'i'}
-        if secondary_type:
-            query['pokemon.secondary_type'] = {'$regex': f'^{secondary_type}$', '$options': 'i'}
-        if min_height is not None or max_height is not None:
-            height_query = {}
-            if min_height is not None:
-                height_query['$gte'] = min_height
-            if max_height is not None:
-                height_query['$lte'] = max_height
-            query['pokemon.height'] = height_query
-        if min_weight is not None or max_weight is not None:
-            weight_query = {}
-            if min_weight is not None:
-                weight_query['$gte'] = min_weight
-            if max_weight is not None:
-                weight_query['$lte'] = max_weight
-            query['pokemon.weight'] = weight_query
-        if min_capture_rate is not None or max_capture_rate is not None:
-            capture_rate_query = {}
-            if min_capture_rate is not None:
-                capture_rate_query['$gte'] = min_capture_rate
-            if max_capture_rate is not None:
-                capture_rate_query['$lte'] = max_capture_rate
-            query['pokemon.capture_rate'] = capture_rate_query
-        if legendary in ['true', 'false']:
-            query['pokemon.legendary'] = legendary == 'true'
-
-        # Sorting
-        sort_field = 'pokemon.pokemonId'
-        sort_direction = 1
-        if sort_option == 'Name':
-            sort_field = 'pokemon.name'
-        elif sort_option == 'HP':
-            sort_field = 'pokemon.hp'
-            sort_direction = -1
-        elif sort_option == 'Attack':
-            sort_field = 'pokemon.attack'
-            sort_direction = -1
-        elif sort_option == 'Defense':
-            sort_field = 'pokemon.defense'
-            sort_direction = -1
-        elif sort_option == 'Speed':
-            sort_field = 'pokemon.speed'
-            sort_direction = -1
-        elif sort_option == 'Height':
-            sort_field = 'pokemon.height'
-            sort_direction = -1
-        elif sort_option == 'Weight':
-            sort_field = 'pokemon.weight'
-            sort_direction = -1
-        elif sort_option == 'Capture Rate':
-            sort_field = 'pokemon.capture_rate'
-            sort_direction = 1
-
-        total_pokemon = merged_collection.count_documents(query)
-        total_pages = 1
-        skip = 0
-        limit = None
-        if per_page:
-            skip = (page - 1) * per_page
-            limit = per_page
-            total_pages = (total_pokemon + per_page - 1) // per_page
+        try:
+            plan = _list_plan(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
+        total_pokemon = _count_pokemon(plan['query'])
         pokemon_data = list(
-            merged_collection
-            .find(query)
-            .sort(sort_field, sort_direction)
-            .skip(skip)
-            .limit(limit if limit else total_pokemon)
+            mongo.db.MergedPokemonSightings
+            .find(plan['find_query'], plan['projection'])
+            .sort(plan['sort'])
+            .skip(plan['skip'])
+            .limit(plan['limit'])
         )
 
-        for pokemon in pokemon_data:
-            pokemon['_id'] = str(pokemon['_id'])
-            if pokemon.get('image_path'):
-                pokemon['image_path'] = str(pokemon['image_path'])
-            for sighting in pokemon.get('sightings', []):
-                if isinstance(sighting['date'], datetime):
-                    sighting['date'] = sighting['date'].isoformat()
-            for comment in pokemon.get('comments', []):
-                if isinstance(comment['date'], datetime):
-                    comment['date'] = comment['date'].isoformat()
+        if plan['include_sightings']:
+            sightings_by_pokemon = _load_sightings([p['pokemon']['pokemonId'] for p in pokemon_data])
+            for pokemon in pokemon_data:
+                pokemon['sightings'] = sightings_by_pokemon[pokemon['pokemon']['pokemonId']]
 
-        return jsonify({
-            'pokemon': pokemon_data,
-            'totalPokemon': total_pokemon,
-            'totalPages': total_pages,
-            'currentPage': page
-        }), 200
+        return jsonify(_list_response(plan, pokemon_data, total_pokemon)), 200
 
     except Exception as e:
         logging.error(f"Error in get_all_pokemon: {str(e)}")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+@pokemon_bp.route('/pokemon/facets', methods=['GET'])
+@cached_response(POKEDEX_KEYS)
+def get_pokemon_facets():
+    try:
+        # Takes the same filter parameters as get_all_pokemon
+        try:
+            buckets = _facet_buckets(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        pipeline = _facets_pipeline(_filter_query(request.args), buckets)
+        result = next(mongo.db.MergedPokemonSightings.aggregate(pipeline))
+        return jsonify(_facets_response(result)), 200
+    except Exception as e:
+        logging.error(f"Error in get_pokemon_facets: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 @pokemon_bp.route('/pokemon/<pokemonId>', methods=['GET'])
+@cached_response(_version_keys)
 def get_pokemon_by_id(pokemonId):
     try:
         # Use pokemonId as a string directly, no conversion to int
-        pokemon = merged_collection.find_one({"pokemon.pokemonId": pokemonId})
+        projection, card = _build_projection(request.args)
+        # The card view of a single Pokémon is served from the in-memory stats store
+        if card and not request.args.get('fields'):
+            record = stats_store.get(pokemonId)
+            if record:
+                return jsonify(record.to_dict()), 200
+
+        pokemon = mongo.db.MergedPokemonSightings.find_one({"pokemon.pokemonId": pokemonId}, projection)
         if not pokemon:
             logging.debug(f"No Pokémon found for ID: {pokemonId}")
             return jsonify({"error": f"No Pokémon found with ID {pokemonId}. Check if the ID exists in the database."}), 404
 
-        # Convert ObjectId to string for JSON serialization
-        pokemon['_id'] = str(pokemon['_id'])
-        if pokemon.get('image_path'):
-            pokemon['image_path'] = str(pokemon['image_path'])
-        # Convert datetime objects to ISO format
-        for sighting in pokemon.get('sightings', []):
-            if isinstance(sighting['date'], datetime):
-                sighting['date'] = sighting['date'].isoformat()
-        for comment in pokemon.get('comments', []):
-            if isinstance(comment['date'], datetime):
-                comment['date'] = comment['date'].isoformat()
+        if _include_sightings(request.args) and not card:
+            pokemon['sightings'] = _load_sightings([pokemonId])[pokemonId]
 
         return jsonify(pokemon), 200
     except Exception as e:
@@ -161,52 +512,267 @@ def get_pokemon_by_id(pokemonId):
 def get_sightings_by_area(pokemonId):
     try:
         # Keep pokemonId as a string, no conversion
-        latitude = request.args.get('latitude', type=float)
-        longitude = request.args.get('longitude', type=float)
-        radius = request.args.get('radius', 10, type=float)
+        try:
+            plan = _sightings_plan(request.args, pokemonId)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        pokemon = merged_collection.find_one({"pokemon.pokemonId": pokemonId})
-        if not pokemon:
+        if not mongo.db.MergedPokemonSightings.count_documents({"pokemon.pokemonId": pokemonId}, limit=1):
             logging.debug(f"No Pokémon found for sightings with ID: {pokemonId}")
             return jsonify({"error": f"Pokémon with ID {pokemonId} not found"}), 404
 
-        sightings = pokemon.get('sightings', [])
-        filtered_sightings = sightings
-
-        if latitude is not None and longitude is not None:
-            center = [longitude, latitude]  # [lng, lat] order for MongoDB
-            radius_in_radians = radius / 6378.137  # Earth's radius in km
-
-            pipeline = [
-                {"$match": {"pokemon.pokemonId": pokemonId}},  # String match
-                {"$unwind": "$sightings"},
-                {
-                    "$match": {
-                        "sightings.location": {
-                            "$geoWithin": {
-                                "$centerSphere": [center, radius_in_radians]
-                            }
-                        }
-                    }
+        if 'pipeline' in plan:
+            cursor = mongo.db.PokemonSightingPoints.aggregate(plan['pipeline'])
+        else:
+            cursor = mongo.db.PokemonSightingPoints.find(plan['query'], SIGHTING_PROJECTION).sort("date", 1)
+            if plan['limit']:
+                cursor = cursor.limit(plan['limit'])
+
+        # Sent as the cursor yields them, without holding every sighting in memory
+        return stream_json_array(cursor)
+    except Exception as e:
+        logging.error(f"Error in get_sightings_by_area for ID {pokemonId}: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@pokemon_bp.route('/pokemon/<pokemonId>/sightings/clusters', methods=['GET'])
+@cached_response(POKEDEX_KEYS)
+def get_sighting_clusters(pokemonId):
+    try:
+        # Bounding box in degrees (defaults to the whole map) and Google Maps zoom level.
+        # minLng > maxLng is a box across the antimeridian, as Google Maps reports it.
+        min_lat = request.args.get('minLat', -90, type=float)
+        max_lat = request.args.get('maxLat', 90, type=float)
+        min_lng = request.args.get('minLng', -180, type=float)
+        max_lng = request.args.get('maxLng', 180, type=float)
+        zoom = request.args.get('zoom', 2, type=int)
+
+        if min_lat > max_lat:
+            return jsonify({"error": "minLat must not exceed maxLat"}), 400
+        if zoom < 0 or zoom > MAX_CLUSTER_ZOOM:
+            return jsonify({"error": f"zoom must be between 0 and {MAX_CLUSTER_ZOOM}"}), 400
+
+        if not mongo.db.MergedPokemonSightings.count_documents({"pokemon.pokemonId": pokemonId}, limit=1):
+            logging.debug(f"No Pokémon found for sighting clusters with ID: {pokemonId}")
+            return jsonify({"error": f"Pokémon with ID {pokemonId} not found"}), 404
+
+        # A 256px map tile spans 360 / 2^zoom degrees; split each tile into CLUSTER_CELLS_PER_TILE cells per side
+        cell_size = 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+        # Only the points inside the box are read and grouped; a box across the antimeridian is
+        # split in two at ±180, and a box covering every longitude needs no location filter
+        match = {"pokemonId": pokemonId}  # String match
+        if min_lng > max_lng:
+            boxes = [(min_lng, 180), (-180, max_lng)]
+        elif max_lng - min_lng < 360 and (min_lng > -180 or max_lng < 180):
+            boxes = [(min_lng, max_lng)]
+        elif min_lat > -90 or max_lat < 90:
+            boxes = [(-180, 180)]
+        else:
+            boxes = []  # The whole map
+        within = [{"location": {"$geoWithin": {"$box": [[low, min_lat], [high, max_lat]]}}} for low, high in boxes]
+        if len(within) == 1:
+            match.update(within[0])
+        elif within:
+            match["$or"] = within
+
+        pipeline = [
+            {"$match": match},
+            {"$project": {
+                "_id": 0,
+                "lng": {"$arrayElemAt": ["$location.coordinates", 0]},
+                "lat": {"$arrayElemAt": ["$location.coordinates", 1]}
+            }},
+            {"$group": {
+                "_id": {
+                    "x": {"$floor": {"$divide": ["$lng", cell_size]}},
+                    "y": {"$floor": {"$divide": ["$lat", cell_size]}}
                 },
-                {
-                    "$group": {
-                        "_id": "$_id",
-                        "sightings": {"$push": "$sightings"}
-                    }
-                }
+                "count": {"$sum": 1},
+                "latitude": {"$avg": "$lat"},
+                "longitude": {"$avg": "$lng"}
+            }},
+            {"$sort": {"count": -1}}
+        ]
+
+        clusters = []
+        total_sightings = 0
+        for cell in mongo.db.PokemonSightingPoints.aggregate(pipeline):
+            total_sightings += cell['count']
+            clusters.append({
+                "latitude": cell['latitude'],
+                "longitude": cell['longitude'],
+                "count": cell['count']
+            })
+
+        return jsonify({
+            "zoom": zoom,
+            "cellSize": cell_size,
+            "totalSightings": total_sightings,
+            "clusters": clusters
+        }), 200
+    except Exception as e:
+        logging.error(f"Error in get_sighting_clusters for ID {pokemonId}: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@pokemon_bp.route('/pokemon/<pokemonId>/sightings/timeline', methods=['GET'])
+@cached_response(POKEDEX_KEYS)
+def get_sighting_timeline(pokemonId):
+    try:
+        # Histograms by hour of day, weekday and day, read from the daily rollups
+        try:
+            collection, query = _rollup_query(request.args, pokemonId)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if stats_store.get(pokemonId) is None:
+            logging.debug(f"No Pokémon found for sighting timeline with ID: {pokemonId}")
+            return jsonify({"error": f"Pokémon with ID {pokemonId} not found"}), 404
+
+        by_hour = [0] * 24
+        by_weekday = [0] * 7  # Monday first
+        by_day = {}
+        rollups = collection.find(query, {"_id": 0, "day": 1, "weekday": 1, "count": 1, "hours": 1}).sort("day", 1)
+        for rollup in rollups:
+            for hour, count in enumerate(rollup['hours']):
+                by_hour[hour] += count
+            if rollup.get('weekday'):
+                by_weekday[rollup['weekday'] - 1] += rollup['count']
+            by_day[rollup['day']] = by_day.get(rollup['day'], 0) + rollup['count']
+
+        return jsonify({
+            "pokemonId": pokemonId,
+            "totalSightings": sum(by_day.values()),
+            "byHour": by_hour,
+            "byWeekday": by_weekday,
+            "byDay": [{"day": day, "count": count} for day, count in by_day.items()]
+        }), 200
+    except Exception as e:
+        logging.error(f"Error in get_sighting_timeline for ID {pokemonId}: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@pokemon_bp.route('/sightings/counts', methods=['GET'])
+@cached_response(POKEDEX_KEYS)
+def get_sighting_counts():
+    try:
+        # Sightings per Pokémon over a date range (and optionally a cell), most sighted first
+        try:
+            collection, query = _rollup_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        pipeline = [
+            {"$match": query},
+            {"$group": {"_id": "$pokemonId", "count": {"$sum": "$count"}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ]
+        counts = [{"pokemonId": row['_id'], "count": row['count']} for row in collection.aggregate(pipeline)]
+
+        return jsonify({
+            "totalSightings": sum(row['count'] for row in counts),
+            "pokemon": counts
+        }), 200
+    except Exception as e:
+        logging.error(f"Error in get_sighting_counts: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@pokemon_bp.route('/sightings/nearby', methods=['GET'])
+def get_nearby_sightings():
+    try:
+        # Sightings of every species around a point (radius in km, or the k nearest) or inside a
+        # bounding box, served from the in-memory sighting index
+        latitude = request.args.get('latitude', type=float)
+        longitude = request.args.get('longitude', type=float)
+        radius = request.args.get('radius', type=float)
+        k = request.args.get('k', type=int)
+        box = [request.args.get(name, type=float) for name in ('minLat', 'maxLat', 'minLng', 'maxLng')]
+        types = {t.strip().lower() for t in request.args.get('type', '').split(',') if t.strip()}
+        limit = request.args.get('limit', NEARBY_LIMIT, type=int)
+
+        if limit <= 0 or limit > MAX_NEARBY_LIMIT:
+            return jsonify({"error": f"limit must be between 1 and {MAX_NEARBY_LIMIT}"}), 400
+        if k is not None and (k <= 0 or k > MAX_NEARBY_LIMIT):
+            return jsonify({"error": f"k must be between 1 and {MAX_NEARBY_LIMIT}"}), 400
+        if radius is not None and radius <= 0:
+            return jsonify({"error": "radius must be positive"}), 400
+        use_box = all(value is not None for value in box)
+        if not use_box and (latitude is None or longitude is None):
+            return jsonify({"error": "latitude and longitude, or minLat, maxLat, minLng and maxLng are required"}), 400
+
+        # The index is built in the background at startup
+        if not sighting_index.ready():
+            return jsonify({"error": "The sighting index is still loading, try again shortly"}), 503, {"Retry-After": "5"}
+
+        # Optional type filter, on the primary or secondary type
+        pokemon_ids = None
+        if types:
+            pokemon_ids = [
+                record.pokemon_id for record in stats_store.records()
+                if record.primary_type.lower() in types or (record.secondary_type or '').lower() in types
             ]
 
-            result = list(merged_collection.aggregate(pipeline))
-            filtered_sightings = result[0]['sightings'] if result else []
+        if use_box:
+            min_lat, max_lat, min_lng, max_lng = box
+            if min_lat > max_lat:
+                return jsonify({"error": "minLat must not exceed maxLat"}), 400
+            # minLng > maxLng is a box across the antimeridian
+            total, sightings = sighting_index.within_box(min_lat, max_lat, min_lng, max_lng, pokemon_ids, limit)
+        elif k is not None:
+            total, sightings = sighting_index.nearest(latitude, longitude, k, pokemon_ids, max_radius=radius)
+        else:
+            total, sightings = sighting_index.within_radius(latitude, longitude, radius or 10, pokemon_ids, limit)
 
-        for sighting in filtered_sightings:
-            if isinstance(sighting['date'], datetime):
-                sighting['date'] = sighting['date'].isoformat()
+        for sighting in sightings:
+            record = stats_store.get(sighting['pokemonId'])
+            sighting['name'] = record.name if record else None
 
-        return jsonify(filtered_sightings), 200
+        return jsonify({
+            "totalSightings": total,
+            "sightings": sightings
+        }), 200
     except Exception as e:
-        logging.error(f"Error in get_sightings_by_area for ID {pokemonId}: {str(e)}")
+        logging.error(f"Error in get_nearby_sightings: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@pokemon_bp.route('/pokemon/<pokemonId>/comments', methods=['GET'])
+def get_comments(pokemonId):
+    try:
+        # Keep pokemonId as a string, no conversion
+        per_page = request.args.get('perPage', COMMENTS_PER_PAGE, type=int)
+        cursor = request.args.get('cursor', '').strip()  # Optional, from a previous nextCursor
+
+        if per_page <= 0 or per_page > MAX_COMMENTS_PER_PAGE:
+            return jsonify({"error": f"perPage must be between 1 and {MAX_COMMENTS_PER_PAGE}"}), 400
+
+        pokemon = mongo.db.MergedPokemonSightings.find_one({"pokemon.pokemonId": pokemonId}, {"comments_count": 1})
+        if not pokemon:
+            logging.debug(f"No Pokémon found for comments with ID: {pokemonId}")
+            return jsonify({"error": f"Pokémon with ID {pokemonId} not found"}), 404
+
+        query = {"pokemonId": pokemonId}  # String match
+        if cursor:
+            try:
+                query.update(_decode_comment_cursor(cursor))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        comments = list(
+            mongo.db.PokemonComments
+            .find(query, {"pokemonId": 0})
+            .sort([("date", -1), ("_id", -1)])
+            .limit(per_page)
+        )
+
+        next_cursor = None
+        if len(comments) == per_page:
+            next_cursor = _encode_comment_cursor(comments[-1])
+
+        return jsonify({
+            "comments": comments,
+            "totalComments": pokemon.get('comments_count', 0),
+            "nextCursor": next_cursor
+        }), 200
+    except Exception as e:
+        logging.error(f"Error in get_comments for ID {pokemonId}: {str(e)}")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 @pokemon_bp.route('/pokemon/<pokemonId>/comments', methods=['POST'])
@@ -219,24 +785,33 @@ def add_comment(pokemonId):
             return jsonify({"error": "Comment text is required"}), 400
 
         new_comment = {
+            "pokemonId": pokemonId,
             "text": data['text'],
             "author": data.get('author', 'CurrentUser'),
             "date": datetime.utcnow()
         }
 
-        result = merged_collection.update_one(
+        # Only the small counter on the Pokémon document is updated; the comment gets its own document
+        result = mongo.db.MergedPokemonSightings.update_one(
             {"pokemon.pokemonId": pokemonId},  # String match
-            {"$push": {"comments": new_comment}}
+            {"$inc": {"comments_count": 1}}
         )
 
         if result.matched_count == 0:
             logging.debug(f"No Pokémon found for comment with ID: {pokemonId}")
             return jsonify({"error": f"Pokémon with ID {pokemonId} not found"}), 404
-        if result.modified_count == 0:
-            logging.debug(f"Comment not added for Pokémon ID {pokemonId} - no changes made")
-            return jsonify({"error": f"Comment not added for Pokémon ID {pokemonId}"}), 500
 
-        new_comment['date'] = new_comment['date'].isoformat()
+        try:
+            mongo.db.PokemonComments.insert_one(new_comment)
+        except Exception:
+            # Keep the denormalized count in step with the comments that were actually stored
+            mongo.db.MergedPokemonSightings.update_one({"pokemon.pokemonId": pokemonId}, {"$inc": {"comments_count": -1}})
+            raise
+
+        # comments_count is part of the cached full-view Pokémon responses
+        data_version.bump('comments')
+
+        del new_comment['pokemonId']
         return jsonify(new_comment), 201
     except Exception as e:
         logging.error(f"Error in add_comment for ID {pokemonId}: {str(e)}")
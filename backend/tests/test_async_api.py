@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+
+pytest.importorskip('quart')
+
+from quart import Quart
+from routes import async_api
+from utils.response_cache import POKEDEX_KEYS, VERSION_KEYS
+
+
+@pytest.fixture
+def client():
+    app = Quart(__name__)
+    app.register_blueprint(async_api.async_api_bp)
+    return app.test_client()
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    # Answers every lookup from the response cache, so the views run without MongoDB;
+    # records the Meta keys each lookup asked for
+    lookups = []
+
+    async def lookup_async(path, args, if_none_match, keys=VERSION_KEYS):
+        lookups.append(keys)
+        return ('key', '1.*', 'etag'), 200, b'{"pokemon": []}'
+
+    monkeypatch.setattr(async_api.response_cache, 'lookup_async', lookup_async)
+    return lookups
+
+
+@pytest.mark.parametrize("query, keys", [
+    ('', VERSION_KEYS),
+    ('?view=card', POKEDEX_KEYS),
+    ('?fields=pokemon.name,comments_count', VERSION_KEYS),
+])
+def test_get_all_pokemon_version_keys(client, cached, query, keys):
+    response = asyncio.run(client.get(f'/api/pokemon{query}'))
+    assert response.status_code == 200
+    assert cached == [keys]
+
+
+def test_get_pokemon_facets_cached(client, cached):
+    response = asyncio.run(client.get('/api/pokemon/facets'))
+    assert response.status_code == 200
+    assert cached == [POKEDEX_KEYS]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from models import battle
+from models.battle import (
+    MAX_TURNS, TEAM_SIZE, WINNER_NAMES, battle_stats, play_turn, simulate, simulate_sharded, winner_by_health
+)
+
+
+def _random_stats(rng, battles):
+    # (health, attack power) arrays shaped like the game's teams, from Pokédex-like stat ranges
+    hp, attack, defense, speed = (rng.integers(1, 256, (battles, TEAM_SIZE)) for _ in range(4))
+    return battle_stats(hp, attack, defense, speed)
+
+
+def _team(name, health, power):
+    return [
+        {"name": f"{name}{i}", "health": float(h), "attackPower": float(p)}
+        for i, (h, p) in enumerate(zip(health, power))
+    ]
+
+
+def _play(user_health, user_power, cpu_health, cpu_power):
+    # One battle through the turn-by-turn game logic: (winner, turns played, decided by health)
+    user_team = _team("user", user_health, user_power)
+    cpu_team = _team("cpu", cpu_health, cpu_power)
+    for turn in range(1, MAX_TURNS + 1):
+        _, _, game_over, winner = play_turn(user_team, cpu_team, turn)
+        if game_over:
+            return winner, turn, False
+    return winner_by_health(user_team, cpu_team), MAX_TURNS, True
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_simulate_matches_play_turn(seed):
+    rng = np.random.default_rng(seed)
+    user_health, user_power = _random_stats(rng, 500)
+    cpu_health, cpu_power = _random_stats(rng, 500)
+    # Tanky teams that last MAX_TURNS and are decided by health (mirrored ones tie on it),
+    # and one-sided battles that end on the first turn
+    user_health[:40] *= 50
+    cpu_health[:40] *= 50
+    cpu_health[:20], cpu_power[:20] = user_health[:20], user_power[:20]
+    user_power[40:60] *= 20
+
+    outcome, turns, by_health = simulate(user_health, user_power, cpu_health, cpu_power)
+
+    for i in range(len(outcome)):
+        winner, played, decided_by_health = _play(user_health[i], user_power[i], cpu_health[i], cpu_power[i])
+        assert (WINNER_NAMES[outcome[i]], turns[i], by_health[i]) == (winner, played, decided_by_health), i
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_simulate_sharded_matches_simulate(seed):
+    rng = np.random.default_rng(seed)
+    # An uneven battle count, so the shards differ in size
+    user_health, user_power = _random_stats(rng, 1001)
+    cpu_health, cpu_power = _random_stats(rng, 1001)
+    user_health[:100] *= 50
+
+    expected = simulate(user_health, user_power, cpu_health, cpu_power, max_turns=7)
+    executors = []
+    for _ in range(2):
+        sharded = simulate_sharded(user_health, user_power, cpu_health, cpu_power, max_turns=7, workers=3)
+        for expected_array, sharded_array in zip(expected, sharded):
+            np.testing.assert_array_equal(sharded_array, expected_array)
+        executors.append(battle._executor)
+    # Both calls ran on the same worker processes
+    assert executors[0] is not None and executors[0] is executors[1]
@@ -0,0 +1,83 @@
+from flask import Response, stream_with_context
+from flask.json.provider import JSONProvider
+from bson import ObjectId
+from utils.metrics import json_encode_duration
+import orjson
+import time
+
+# Serialize numpy arrays/scalars natively and allow non-string dict keys
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Items serialized per chunk when streaming a JSON array
+STREAM_CHUNK_ITEMS = 500
+
+
+def _default(value):
+    # Types orjson does not know; datetimes, dicts (GeoJSON) and numpy values are handled natively
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONProvider(JSONProvider):
+    # Used by jsonify and request.get_json for the whole app, so routes can return
+    # MongoDB documents as they come out of the driver
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        started = time.perf_counter()
+        body = dumps_bytes(obj)
+        json_encode_duration.observe(time.perf_counter() - started)
+        return self._app.response_class(body, mimetype='application/json')
+
+
+def _array_chunks(items):
+    chunk = []
+    first = True
+    for item in items:
+        chunk.append(dumps_bytes(item))
+        if len(chunk) >= STREAM_CHUNK_ITEMS:
+            yield (b'[' if first else b',') + b','.join(chunk)
+            first = False
+            chunk = []
+    if first:
+        yield b'[' + b','.join(chunk) + b']'
+    elif chunk:
+        yield b',' + b','.join(chunk) + b']'
+    else:
+        yield b']'
+
+
+async def async_array_chunks(items):
+    # Same output as _array_chunks, for async iterables such as AsyncMongoClient cursors
+    chunk = []
+    first = True
+    async for item in items:
+        chunk.append(dumps_bytes(item))
+        if len(chunk) >= STREAM_CHUNK_ITEMS:
+            yield (b'[' if first else b',') + b','.join(chunk)
+            first = False
+            chunk = []
+    if first:
+        yield b'[' + b','.join(chunk) + b']'
+    elif chunk:
+        yield b',' + b','.join(chunk) + b']'
+    else:
+        yield b']'
+
+
+def stream_json_array(items, status=200):
+    # Sends an iterable (e.g. a MongoDB cursor) as a chunked JSON array without
+    # building the whole list or response body in memory
+    return Response(stream_with_context(_array_chunks(items)), status=status, mimetype='application/json')
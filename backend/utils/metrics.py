@@ -0,0 +1,311 @@
+import itertools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from flask import g, request
+import bson
+from bson import json_util
+from pymongo import monitoring
+
+# Prometheus default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Commands whose plan can be captured with explain when they are slow
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+
+# Re-encoding a reply to measure it costs about as much as decoding it did, so only one reply
+# in REPLY_SIZE_SAMPLE per command and collection is measured and counted that many times
+REPLY_SIZE_SAMPLE = 16
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (non-cumulative, last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    labels = _format_labels(self.labels + ('le',), label_values + (le,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    # Metrics are per process; with several gunicorn workers each one exposes its own
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'pokemap_http_request_duration_seconds', 'Time spent in the view, by blueprint and endpoint.',
+    ('blueprint', 'endpoint', 'method', 'status'))
+request_mongo_duration = registry.histogram(
+    'pokemap_http_request_mongo_seconds', 'MongoDB time spent by a single request.',
+    ('blueprint', 'endpoint'))
+response_bytes = registry.counter(
+    'pokemap_http_response_bytes_total', 'Response body bytes sent (streamed bodies are not counted).',
+    ('blueprint', 'endpoint'))
+json_encode_duration = registry.histogram(
+    'pokemap_json_encode_seconds', 'Time spent serializing JSON responses.',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+command_duration = registry.histogram(
+    'pokemap_mongo_command_duration_seconds', 'MongoDB command latency as seen by the driver.',
+    ('command', 'collection'))
+command_documents = registry.counter(
+    'pokemap_mongo_command_documents_total', 'Documents returned or written by MongoDB commands.',
+    ('command', 'collection'))
+command_reply_bytes = registry.counter(
+    'pokemap_mongo_command_reply_bytes_total', 'BSON bytes of MongoDB command replies, estimated from a sample.',
+    ('command', 'collection'))
+command_failures = registry.counter(
+    'pokemap_mongo_command_failures_total', 'Failed MongoDB commands.',
+    ('command', 'collection'))
+slow_commands = registry.counter(
+    'pokemap_mongo_slow_commands_total', 'MongoDB commands slower than SLOW_QUERY_MS.',
+    ('command', 'collection'))
+
+
+def _reply_documents(command_name, reply):
+    cursor = reply.get('cursor')
+    if cursor:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    if 'n' in reply:
+        return reply['n']
+    return len(reply.get('values', []))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    # Records every command the app's MongoClient runs. Callbacks run on the thread
+    # that issued the command, so the time is also added to the current request.
+
+    def __init__(self):
+        self.slow_query_ms = None
+        self.explain_interval = 60
+        self._client = None
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._local = threading.local()
+        self._last_explained = {}
+        self._explained_lock = threading.Lock()
+        self._reply_samples = defaultdict(itertools.count)
+        # explain() can't run inside a listener callback, so it is queued to one background thread
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+
+    def configure(self, client_getter, slow_query_ms, explain_interval):
+        self._client = client_getter
+        # 0 turns slow query logging off
+        self.slow_query_ms = slow_query_ms if slow_query_ms > 0 else None
+        self.explain_interval = explain_interval
+
+    def start_request(self):
+        self._local.mongo_seconds = 0.0
+
+    def request_mongo_seconds(self):
+        return getattr(self._local, 'mongo_seconds', 0.0)
+
+    def started(self, event):
+        if event.command_name == 'explain':
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = command.get('collection')
+        if not isinstance(collection, str):
+            collection = ''
+        # The command document is only kept when it might be explained later
+        keep = event.command_name in EXPLAINABLE_COMMANDS and self.slow_query_ms is not None
+        with self._pending_lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection, event.database_name, dict(command) if keep else None
+            )
+
+    def _finish(self, event):
+        with self._pending_lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        pending = self._finish(event)
+        if pending is None:
+            return
+        collection, database_name, command = pending
+        seconds = event.duration_micros / 1e6
+        name = event.command_name
+        command_duration.observe(seconds, name, collection)
+        command_documents.inc(name, collection, amount=_reply_documents(name, event.reply))
+        if next(self._reply_samples[(name, collection)]) % REPLY_SIZE_SAMPLE == 0:
+            command_reply_bytes.inc(name, collection, amount=len(bson.encode(event.reply)) * REPLY_SIZE_SAMPLE)
+        if hasattr(self._local, 'mongo_seconds'):
+            self._local.mongo_seconds += seconds
+
+        if self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms:
+            slow_commands.inc(name, collection)
+            if command is not None:
+                self._queue_explain(name, collection, database_name, command, seconds)
+            else:
+                logging.warning(f"Slow MongoDB command {name} on {database_name}.{collection}: {seconds * 1000:.1f}ms")
+
+    def failed(self, event):
+        pending = self._finish(event)
+        if pending is None:
+            return
+        collection = pending[0]
+        command_failures.inc(event.command_name, collection)
+        if hasattr(self._local, 'mongo_seconds'):
+            self._local.mongo_seconds += event.duration_micros / 1e6
+
+    def _queue_explain(self, name, collection, database_name, command, seconds):
+        # Each query shape (command, collection, filter/pipeline keys) is explained at most once per interval
+        shape = (name, database_name, collection, repr(sorted(command.get('filter', {}))),
+                 len(command.get('pipeline', [])))
+        now = time.monotonic()
+        # Listener callbacks run on every request thread, so the check and the update are one step
+        with self._explained_lock:
+            recent = now - self._last_explained.get(shape, -self.explain_interval) < self.explain_interval
+            if not recent:
+                self._last_explained[shape] = now
+        if recent:
+            logging.warning(f"Slow MongoDB {name} on {database_name}.{collection}: {seconds * 1000:.1f}ms")
+            return
+        self._explainer.submit(self._explain, name, collection, database_name, command, seconds)
+
+    def _explain(self, name, collection, database_name, command, seconds):
+        try:
+            # Session, cluster time and read preference fields are added by the driver and not explainable
+            explainable = {k: v for k, v in command.items() if not k.startswith('$') and k not in ('lsid', 'txnNumber')}
+            if name == 'aggregate':
+                explainable.setdefault('cursor', {})
+            plan = self._client().get_database(database_name).command(
+                {'explain': explainable, 'verbosity': 'queryPlanner'}
+            )
+            query_planner = plan.get('queryPlanner') or plan.get('stages', [{}])[0].get('$cursor', {}).get('queryPlanner', {})
+            logging.warning(
+                f"Slow MongoDB {name} on {database_name}.{collection}: {seconds * 1000:.1f}ms\n"
+                f"command: {json_util.dumps(explainable)}\n"
+                f"winningPlan: {json_util.dumps(query_planner.get('winningPlan', plan))}"
+            )
+        except Exception as e:
+            logging.warning(f"Slow MongoDB {name} on {database_name}.{collection}: {seconds * 1000:.1f}ms (explain failed: {str(e)})")
+
+
+command_metrics = CommandMetrics()
+
+
+def _endpoint_labels():
+    endpoint = request.endpoint or 'unmatched'
+    return request.blueprint or '', endpoint.rsplit('.', 1)[-1]
+
+
+def init_app(app, blueprints):
+    # Times every request served by the given blueprints; the MongoClient picks up
+    # command_metrics through Mongo.add_listener before it is created
+    config = app.config
+    command_metrics.configure(
+        lambda: app.extensions['mongo'].client,
+        config['SLOW_QUERY_MS'],
+        config['SLOW_QUERY_EXPLAIN_INTERVAL']
+    )
+    app.extensions['mongo'].add_listener(command_metrics)
+
+    names = {blueprint.name for blueprint in blueprints}
+
+    @app.before_request
+    def _start_timer():
+        if request.blueprint in names:
+            g.metrics_started = time.perf_counter()
+            command_metrics.start_request()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        blueprint, endpoint = _endpoint_labels()
+        method, status = request.method, response.status_code
+
+        def record():
+            request_duration.observe(time.perf_counter() - started, blueprint, endpoint, method, status)
+            request_mongo_duration.observe(command_metrics.request_mongo_seconds(), blueprint, endpoint)
+
+        if response.is_streamed:
+            # A streamed body (e.g. a cursor's getMores) is only produced after this hook; the server
+            # closes the response on the same thread once it is sent, so it is timed to the end
+            response.call_on_close(record)
+        else:
+            record()
+            if response.content_length:
+                response_bytes.inc(blueprint, endpoint, amount=response.content_length)
+        return response
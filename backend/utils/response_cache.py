@@ -0,0 +1,225 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import Response, make_response, request
+from extensions import async_mongo, mongo
+from utils.cache import ByteLRUCache
+from utils.metrics import registry
+
+# Meta documents whose versions identify the data behind a cached response:
+# 'pokedex' is bumped by pokemon_script.py, 'comments' by every new comment
+VERSION_KEYS = ('pokedex', 'comments')
+# Responses without comment counts only change with the ETL
+POKEDEX_KEYS = ('pokedex',)
+
+cache_requests = registry.counter(
+    'pokemap_response_cache_requests_total', 'Cacheable requests by outcome (hit, miss, not_modified).',
+    ('result',))
+
+
+class DataVersion:
+    # Combined version of the Pokédex data. Read from the Meta collection at most every
+    # check interval, so other processes' writes show up within that many seconds;
+    # writes made through this process are visible immediately.
+
+    QUERY = {"_id": {"$in": list(VERSION_KEYS)}}
+
+    def __init__(self):
+        self._versions = None
+        self._checked_at = 0.0
+        self._check_interval = 2
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def init_app(self, app):
+        self._check_interval = app.config['RESPONSE_CACHE_VERSION_CHECK_SECONDS']
+
+    def _stale(self):
+        return self._versions is None or time.monotonic() - self._checked_at > self._check_interval
+
+    def _store(self, documents):
+        versions = {document['_id']: document.get('version', 0) for document in documents}
+        self._versions = {key: versions.get(key, 0) for key in VERSION_KEYS}
+        self._checked_at = time.monotonic()
+
+    def _combined(self, keys):
+        # One part per VERSION_KEYS entry, '*' for the keys left out, e.g. '12.*' for POKEDEX_KEYS
+        versions = self._versions
+        return '.'.join(str(versions[key]) if key in keys else '*' for key in VERSION_KEYS)
+
+    def _load(self):
+        self._store(mongo.db.Meta.find(self.QUERY, {"version": 1}))
+
+    def current(self, keys=VERSION_KEYS):
+        # Version of the data behind the given Meta keys, e.g. POKEDEX_KEYS for data only the ETL changes
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._load()
+        return self._combined(keys)
+
+    async def current_async(self, keys=VERSION_KEYS):
+        # current() for the async views: the Meta read is awaited on the AsyncMongoClient
+        # instead of blocking the event loop. While one coroutine refreshes the version,
+        # the others keep using the previous one.
+        if self._stale() and (self._versions is None or not self._refreshing):
+            self._refreshing = True
+            try:
+                self._store(await async_mongo.db.Meta.find(self.QUERY, {"version": 1}).to_list())
+            finally:
+                self._refreshing = False
+        return self._combined(keys)
+
+    def bump(self, name):
+        mongo.db.Meta.update_one(
+            {"_id": name},
+            {"$inc": {"version": 1}, "$set": {"updated": datetime.utcnow()}},
+            upsert=True
+        )
+        with self._lock:
+            self._load()
+
+
+def _compatible(version, other):
+    # Two versions can both be current when every key they both depend on has the same value
+    return all(a == b or '*' in (a, b) for a, b in zip(version.split('.'), other.split('.')))
+
+
+class ResponseCache:
+    # Serialized JSON responses keyed by path, normalized query string and data version.
+    # Tier 1 is an in-process LRU; tier 2 (optional) is a directory on a tmpfs such as
+    # /dev/shm shared by every worker on the host. Entries of older versions are never
+    # read again, so nothing has to be invalidated explicitly.
+
+    def __init__(self):
+        self._memory = None
+        self._shm_dir = None
+        self._shm_max_entries = 10000
+        self._shm_writes = 0
+
+    def init_app(self, app):
+        config = app.config
+        self._memory = ByteLRUCache(config['RESPONSE_CACHE_MAX_BYTES'])
+        self._shm_dir = config['RESPONSE_CACHE_SHM_DIR'] or None
+        self._shm_max_entries = config['RESPONSE_CACHE_SHM_MAX_ENTRIES']
+        data_version.init_app(app)
+        app.extensions['response_cache'] = self
+
+    @staticmethod
+    def key(path, args):
+        # Parameter order and empty parameters don't change the response
+        items = sorted((name, value.strip()) for name, values in args.lists() for value in values if value.strip())
+        return path + '?' + '&'.join(f"{name}={value}" for name, value in items)
+
+    @staticmethod
+    def etag(key, version):
+        # Identical key and version always produce the same body, so the ETag needs no body hash
+        return hashlib.sha1(f"{version}|{key}".encode()).hexdigest()
+
+    def _shm_path(self, key, version):
+        return os.path.join(self._shm_dir, version, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key, version):
+        body = self._memory.get((version, key))
+        if body is not None or not self._shm_dir:
+            return body
+        try:
+            with open(self._shm_path(key, version), 'rb') as entry:
+                body = entry.read()
+        except OSError:
+            return None
+        self._memory.set((version, key), body, len(body))
+        return body
+
+    def set(self, key, version, body):
+        self._memory.set((version, key), body, len(body))
+        if self._shm_dir:
+            try:
+                self._shm_set(key, version, body)
+            except OSError:
+                pass  # The shared tier is best effort; the in-process tier already has the entry
+
+    def _shm_set(self, key, version, body):
+        version_dir = os.path.join(self._shm_dir, version)
+        if not os.path.isdir(version_dir):
+            os.makedirs(version_dir, exist_ok=True)
+            # First entry of a new version: drop the directories of versions it supersedes
+            for name in os.listdir(self._shm_dir):
+                if not _compatible(name, version):
+                    shutil.rmtree(os.path.join(self._shm_dir, name), ignore_errors=True)
+
+        self._shm_writes += 1
+        if self._shm_writes % 256 == 0 and len(os.listdir(version_dir)) >= self._shm_max_entries:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            os.makedirs(version_dir, exist_ok=True)
+
+        # Written under a unique name and renamed, so readers never see a partial file
+        path = self._shm_path(key, version)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporary, 'wb') as entry:
+            entry.write(body)
+        os.replace(temporary, path)
+
+    def lookup(self, path, args, if_none_match, keys=VERSION_KEYS, version=None):
+        # Returns ((key, version, etag), status, body): status is 304 when the client's
+        # copy is current, 200 with the cached body, or None on a miss. keys are the Meta
+        # versions the response depends on.
+        key = self.key(path, args)
+        if version is None:
+            version = data_version.current(keys)
+        etag = self.etag(key, version)
+        if if_none_match.contains(etag):
+            cache_requests.inc('not_modified')
+            return (key, version, etag), 304, b''
+        body = self.get(key, version)
+        if body is not None:
+            cache_requests.inc('hit')
+            return (key, version, etag), 200, body
+        cache_requests.inc('miss')
+        return (key, version, etag), None, None
+
+    async def lookup_async(self, path, args, if_none_match, keys=VERSION_KEYS):
+        # lookup() for the async views, without blocking the event loop on the version check
+        return self.lookup(path, args, if_none_match, keys, await data_version.current_async(keys))
+
+
+def build_response(response_class, body, etag, status):
+    # Works for Flask and Quart responses alike
+    response = response_class(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    # Browsers keep the body but revalidate it each time, which costs a 304 at most
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_response(keys=VERSION_KEYS):
+    # Caches successful JSON responses of a Flask view and answers If-None-Match with 304.
+    # keys are the Meta versions the responses depend on, or a function of the query
+    # arguments returning them.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version_keys = keys(request.args) if callable(keys) else keys
+            (key, version, etag), status, body = response_cache.lookup(
+                request.path, request.args, request.if_none_match, version_keys
+            )
+            if status is not None:
+                return build_response(Response, body, etag, status)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            response_cache.set(key, version, response.get_data())
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+data_version = DataVersion()
+response_cache = ResponseCache()
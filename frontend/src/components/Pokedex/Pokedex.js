@@ -3,6 +3,22 @@ import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
 import './Pokedex.css';
 
+const PLACEHOLDER_IMAGE = 'https://via.placeholder.com/150?text=Pokemon';
+
+// Query parameters for the applied filters, shared by the list and facets requests
+const filterParams = (filters, searchTerm = filters.searchTerm) => ({
+  searchTerm: searchTerm || undefined,
+  primaryType: filters.primaryType || undefined,
+  secondaryType: filters.secondaryType || undefined,
+  minHeight: filters.minHeight ? parseFloat(filters.minHeight) : undefined,
+  maxHeight: filters.maxHeight ? parseFloat(filters.maxHeight) : undefined,
+  minWeight: filters.minWeight ? parseFloat(filters.minWeight) : undefined,
+  maxWeight: filters.maxWeight ? parseFloat(filters.maxWeight) : undefined,
+  minCaptureRate: filters.minCaptureRate ? parseInt(filters.minCaptureRate) : undefined,
+  maxCaptureRate: filters.maxCaptureRate ? parseInt(filters.maxCaptureRate) : undefined,
+  legendary: filters.legendary || undefined,
+});
+
 const Pokedex = () => {
   const navigate = useNavigate();
 
@@ -12,6 +28,10 @@ const Pokedex = () => {
   const [totalPages, setTotalPages] = useState(1);
   const [currentPage, setCurrentPage] = useState(1);
   const [loading, setLoading] = useState(true);
+  const [imageUrls, setImageUrls] = useState({});
+  // 'loading' while the current page's image batch is in flight, then 'done' or 'failed'
+  const [imageBatchStatus, setImageBatchStatus] = useState('loading');
+  const [facets, setFacets] = useState(null);
 
   // State for filter inputs (what the user is typing/selecting)
   const [searchTermInput, setSearchTermInput] = useState('');
@@ -80,17 +100,9 @@ const Pokedex = () => {
       const params = {
         page,
         perPage,
+        view: 'card',
         sortOption: appliedFilters.sortOption,
-        searchTerm: searchTermOverride || undefined,
-        primaryType: appliedFilters.primaryType || undefined,
-        secondaryType: appliedFilters.secondaryType || undefined,
-        minHeight: appliedFilters.minHeight ? parseFloat(appliedFilters.minHeight) : undefined,
-        maxHeight: appliedFilters.maxHeight ? parseFloat(appliedFilters.maxHeight) : undefined,
-        minWeight: appliedFilters.minWeight ? parseFloat(appliedFilters.minWeight) : undefined,
-        maxWeight: appliedFilters.maxWeight ? parseFloat(appliedFilters.maxWeight) : undefined,
-        minCaptureRate: appliedFilters.minCaptureRate ? parseInt(appliedFilters.minCaptureRate) : undefined,
-        maxCaptureRate: appliedFilters.maxCaptureRate ? parseInt(appliedFilters.maxCaptureRate) : undefined,
-        legendary: appliedFilters.legendary || undefined,
+        ...filterParams(appliedFilters, searchTermOverride),
       };
 
       const response = await axios.get('http://localhost:5000/api/pokemon', { params });
@@ -104,6 +116,85 @@ const Pokedex = () => {
     }
   }, [appliedFilters]);
 
+  // Fetch every card image of the current page in one request and slice it into object URLs
+  useEffect(() => {
+    const ids = pokemon.map((poke) => poke.image_path).filter(Boolean);
+    if (ids.length === 0) return undefined;
+
+    let urls = {};
+    let cancelled = false;
+    setImageBatchStatus('loading');
+    axios.get('http://localhost:5000/api/images/batch', {
+      // Cards are at most 150px wide; 256px derivatives stay sharp on high-DPI screens
+      params: { ids: ids.join(','), size: 256 },
+      // axios's default Accept names no image type, which would get PNG; the browsers the app
+      // supports decode all three, and the server sends the smallest of them for each image
+      headers: { Accept: 'image/avif,image/webp,image/png' },
+      responseType: 'arraybuffer',
+    }).then((response) => {
+      // A newer page replaced this one; creating URLs now would leak them
+      if (cancelled) return;
+      // A 4-byte big-endian length, that many bytes of JSON offsets, then the images back to back
+      const preambleLength = new DataView(response.data).getUint32(0);
+      const offsets = JSON.parse(new TextDecoder().decode(new Uint8Array(response.data, 4, preambleLength)));
+      const start = 4 + preambleLength;
+      Object.entries(offsets).forEach(([id, { offset, length, contentType }]) => {
+        const blob = new Blob([response.data.slice(start + offset, start + offset + length)], { type: contentType });
+        urls[id] = URL.createObjectURL(blob);
+      });
+      setImageUrls((current) => ({ ...current, ...urls }));
+      setImageBatchStatus('done');
+    }).catch((error) => {
+      // Cards fall back to one request per image
+      console.error('Error fetching Pokémon images:', error.message);
+      if (!cancelled) setImageBatchStatus('failed');
+    });
+
+    return () => {
+      cancelled = true;
+      // Revoked URLs no longer load, so they must not stay in the state either
+      Object.values(urls).forEach((url) => URL.revokeObjectURL(url));
+      setImageUrls((current) => Object.fromEntries(
+        Object.entries(current).filter(([id]) => !(id in urls)),
+      ));
+    };
+  }, [pokemon]);
+
+  const cardImageSrc = (imagePath) => {
+    if (!imagePath) return PLACEHOLDER_IMAGE;
+    if (imageUrls[imagePath]) return imageUrls[imagePath];
+    // The placeholder while the batch is in flight; afterwards one request per image the batch didn't return
+    if (imageBatchStatus === 'loading') return PLACEHOLDER_IMAGE;
+    return `http://localhost:5000/api/images/${imagePath}?size=256`;
+  };
+
+  // Per-type counts and ranges for the filter form, under the applied filters
+  useEffect(() => {
+    let cancelled = false;
+    axios.get('http://localhost:5000/api/pokemon/facets', { params: filterParams(appliedFilters) })
+      .then((response) => {
+        if (!cancelled) setFacets(response.data);
+      })
+      .catch((error) => {
+        console.error('Error fetching Pokédex facets:', error.response?.data || error.message);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [appliedFilters]);
+
+  // "Fire (12)" when the facets are loaded, the plain type name otherwise
+  const typeLabel = (facet, type) => {
+    const entry = facets?.[facet]?.find((value) => String(value.value).toLowerCase() === type.toLowerCase());
+    return facets ? `${type} (${entry ? entry.count : 0})` : type;
+  };
+
+  // Lowest or highest value available under the applied filters, as an input placeholder
+  const rangeHint = (facet, end) => {
+    const value = facets?.[facet]?.[end];
+    return value === null || value === undefined ? '' : String(value);
+  };
+
   // Debounce function for search
   const debounce = (func, delay) => {
     let timeoutId;
@@ -244,7 +335,7 @@ const Pokedex = () => {
             >
               <option value="">All Types</option>
               {allTypes.map((type) => (
-                <option key={`primary-${type}`} value={type}>{type}</option>
+                <option key={`primary-${type}`} value={type}>{typeLabel('primaryTypes', type)}</option>
               ))}
             </select>
           </div>
@@ -259,7 +350,7 @@ const Pokedex = () => {
             >
               <option value="">All Types</option>
               {allTypes.map((type) => (
-                <option key={`secondary-${type}`} value={type}>{type}</option>
+                <option key={`secondary-${type}`} value={type}>{typeLabel('secondaryTypes', type)}</option>
               ))}
             </select>
           </div>
@@ -272,6 +363,7 @@ const Pokedex = () => {
               name="minHeight"
               min="0"
               step="0.1"
+              placeholder={rangeHint('height', 'min')}
               value={filtersInput.minHeight}
               onChange={handleFilterChange}
             />
@@ -285,6 +377,7 @@ const Pokedex = () => {
               name="maxHeight"
               min="0"
               step="0.1"
+              placeholder={rangeHint('height', 'max')}
               value={filtersInput.maxHeight}
               onChange={handleFilterChange}
             />
@@ -298,6 +391,7 @@ const Pokedex = () => {
               name="minWeight"
               min="0"
               step="0.1"
+              placeholder={rangeHint('weight', 'min')}
               value={filtersInput.minWeight}
               onChange={handleFilterChange}
             />
@@ -311,6 +405,7 @@ const Pokedex = () => {
               name="maxWeight"
               min="0"
               step="0.1"
+              placeholder={rangeHint('weight', 'max')}
               value={filtersInput.maxWeight}
               onChange={handleFilterChange}
             />
@@ -324,6 +419,7 @@ const Pokedex = () => {
               name="minCaptureRate"
               min="0"
               max="255"
+              placeholder={rangeHint('captureRate', 'min')}
               value={filtersInput.minCaptureRate}
               onChange={handleFilterChange}
             />
@@ -337,6 +433,7 @@ const Pokedex = () => {
               name="maxCaptureRate"
               min="0"
               max="255"
+              placeholder={rangeHint('captureRate', 'max')}
               value={filtersInput.maxCaptureRate}
               onChange={handleFilterChange}
             />
@@ -405,11 +502,11 @@ const Pokedex = () => {
 
               <div className="pokemon-image">
                 <img
-                  src={poke.image_path ? `http://localhost:5000/api/images/${poke.image_path}` : 'https://via.placeholder.com/150?text=Pokemon'}
+                  src={cardImageSrc(poke.image_path)}
                   alt={poke.pokemon.name}
                   onError={(e) => {
                     e.target.onerror = null;
-                    e.target.src = 'https://via.placeholder.com/150?text=Pokemon';
+                    e.target.src = PLACEHOLDER_IMAGE;
                   }}
                 />
               </div>
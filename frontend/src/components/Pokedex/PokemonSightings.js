@@ -23,6 +23,7 @@ const PokemonSightings = () => {
   const [useCustomCoordinates, setUseCustomCoordinates] = useState(false);
   const [comment, setComment] = useState('');
   const [comments, setComments] = useState([]);
+  const [commentsCursor, setCommentsCursor] = useState(null);
   const [commentStatus, setCommentStatus] = useState('');
 
   const typeColors = {
@@ -50,7 +51,9 @@ const PokemonSightings = () => {
     const fetchPokemonSightings = async () => {
       try {
         setLoading(true);
-        const response = await axios.get(`http://localhost:5000/api/pokemon/${pokemonId}`);
+        const response = await axios.get(`http://localhost:5000/api/pokemon/${pokemonId}`, {
+          params: { includeSightings: true }
+        });
         const data = response.data;
 
         const transformedSightings = (data.sightings || []).map(sighting => ({
@@ -60,7 +63,6 @@ const PokemonSightings = () => {
 
         setPokemon(data.pokemon);
         setSightings(transformedSightings);
-        setComments(data.comments || []);
 
         if (data.image_path) {
           setImageUrl(`http://localhost:5000/api/images/${data.image_path}`);
@@ -333,7 +335,9 @@ const PokemonSightings = () => {
       radius: 10
     });
 
-    const response = await axios.get(`http://localhost:5000/api/pokemon/${pokemonId}`);
+    const response = await axios.get(`http://localhost:5000/api/pokemon/${pokemonId}`, {
+      params: { includeSightings: true }
+    });
     const transformedSightings = (response.data.sightings || []).map(sighting => ({
       ...sighting,
       coords: sighting.location
@@ -396,6 +400,28 @@ const PokemonSightings = () => {
     }
   };
 
+  const fetchComments = async (cursor = null) => {
+    try {
+      const response = await axios.get(`http://localhost:5000/api/pokemon/${pokemonId}/comments`, {
+        params: cursor ? { cursor } : {}
+      });
+      const { comments: page, nextCursor } = response.data;
+      setComments(prev => (cursor ? [...prev, ...page] : page));
+      setCommentsCursor(nextCursor);
+    } catch (err) {
+      console.error('Error fetching comments:', {
+        message: err.message,
+        response: err.response?.data,
+        status: err.response?.status
+      });
+    }
+  };
+
+  useEffect(() => {
+    fetchComments();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [pokemonId]);
+
   const handleCommentChange = (e) => {
     setComment(e.target.value);
   };
@@ -415,7 +441,8 @@ const PokemonSightings = () => {
       });
 
       const newComment = response.data;
-      setComments([...comments, newComment]);
+      // Comments are listed newest first
+      setComments([newComment, ...comments]);
       setComment('');
       setCommentStatus('Comment added successfully!');
 
@@ -668,8 +695,8 @@ const PokemonSightings = () => {
 
         <div className="comments-list">
           {comments && comments.length > 0 ? (
-            comments.map((comment, index) => (
-              <div key={index} className="comment-item">
+            comments.map((comment) => (
+              <div key={comment._id} className="comment-item">
                 <div className="comment-header">
                   <span className="comment-author">{comment.author}</span>
                   <span className="comment-date">{formatDate(comment.date)}</span>
@@ -682,6 +709,11 @@ const PokemonSightings = () => {
               <p>No comments yet. Be the first to share your thoughts!</p>
             </div>
           )}
+          {commentsCursor && (
+            <button type="button" className="comment-submit" onClick={() => fetchComments(commentsCursor)}>
+              Load More Comments
+            </button>
+          )}
         </div>
       </div>
     </div>
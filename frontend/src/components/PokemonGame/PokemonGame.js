@@ -6,17 +6,16 @@ import './PokemonGame.css';
 const PokemonGame = () => {
   const navigate = useNavigate();
   const [userPokemon, setUserPokemon] = useState([]);
-  const [cpuPokemon, setCpuPokemon] = useState([]);
   const [selectedPokemon, setSelectedPokemon] = useState([]);
   const [battleStarted, setBattleStarted] = useState(false);
   const [userTeam, setUserTeam] = useState([]);
   const [cpuTeam, setCpuTeam] = useState([]);
-  const [currentTurn, setCurrentTurn] = useState(1);
   const [battleLog, setBattleLog] = useState([]);
   const [gameOver, setGameOver] = useState(false);
   const [winner, setWinner] = useState(null);
   const [error, setError] = useState(null);
   const [message, setMessage] = useState(null);
+  const [sessionId, setSessionId] = useState(null);
 
   // Type colors for background gradient and type badges
   const typeColors = {
@@ -44,7 +43,7 @@ const PokemonGame = () => {
   const fetchPokemon = async () => {
     try {
       const response = await axios.get('http://localhost:5000/api/game/start');
-      const { userPokemon, cpuPokemon } = response.data;
+      const { sessionId, userPokemon } = response.data;
 
       // Initialize health and attack power for user Pokémon
       const initializedUserPokemon = userPokemon.map(p => ({
@@ -54,21 +53,12 @@ const PokemonGame = () => {
         attackPower: p.pokemon.attack + (p.pokemon.speed / 3) // Use full attack + 1/3 of speed
       }));
 
-      // Initialize health and attack power for CPU Pokémon
-      const initializedCpuPokemon = cpuPokemon.map(p => ({
-        ...p,
-        health: p.pokemon.hp + p.pokemon.defense,
-        maxHealth: p.pokemon.hp + p.pokemon.defense,
-        attackPower: p.pokemon.attack + (p.pokemon.speed / 3) // Use full attack + 1/3 of speed
-      }));
-
+      setSessionId(sessionId);
       setUserPokemon(initializedUserPokemon);
-      setCpuPokemon(initializedCpuPokemon);
       setSelectedPokemon([]);
       setBattleStarted(false);
       setUserTeam([]);
       setCpuTeam([]);
-      setCurrentTurn(1);
       setBattleLog([]);
       setGameOver(false);
       setWinner(null);
@@ -95,35 +85,46 @@ const PokemonGame = () => {
     }
   };
 
-  // Confirm selection and start the battle
-  const handleConfirmSelection = () => {
+  // Confirm selection and start the battle; the server builds both teams for this session
+  const handleConfirmSelection = async () => {
     if (selectedPokemon.length !== 3) {
       setMessage('Please select exactly 3 Pokémon to start the battle.');
       return;
     }
 
-    const selectedTeam = userPokemon.filter(p => selectedPokemon.includes(p._id));
-    setUserTeam(selectedTeam);
-    setCpuTeam(cpuPokemon);
-    setBattleStarted(true);
-    setMessage('Selection confirmed! Starting battle...');
-    setBattleLog([]);
+    try {
+      const response = await axios.post('http://localhost:5000/api/game/select', {
+        sessionId,
+        selected: selectedPokemon
+      });
+
+      setUserTeam(response.data.userTeam);
+      setCpuTeam(response.data.cpuTeam);
+      setBattleStarted(true);
+      setMessage('Selection confirmed! Starting battle...');
+      setBattleLog([]);
+    } catch (err) {
+      setError(err.response?.data?.error || 'Failed to start the battle. Please try again.');
+    }
   };
 
-  // Process the next turn
+  // Process the next turn; only the session id goes up and only health changes come back
   const handleNextTurn = async () => {
     try {
       const response = await axios.post('http://localhost:5000/api/game/turn', {
-        userTeam,
-        cpuTeam,
-        currentTurn
+        sessionId,
+        action: 'attack'
       });
 
-      const { userTeam: updatedUserTeam, cpuTeam: updatedCpuTeam, currentTurn: newTurn, battleLog: newLog, gameOver, winner } = response.data;
+      const { changes, battleLog: newLog, gameOver, winner } = response.data;
+
+      const applyChanges = (team, side) => team.map((p, index) => {
+        const change = changes.find(c => c.team === side && c.index === index);
+        return change ? { ...p, health: change.health } : p;
+      });
 
-      setUserTeam(updatedUserTeam);
-      setCpuTeam(updatedCpuTeam);
-      setCurrentTurn(newTurn);
+      setUserTeam(applyChanges(userTeam, 'user'));
+      setCpuTeam(applyChanges(cpuTeam, 'cpu'));
       setBattleLog([...battleLog, ...newLog]);
       setGameOver(gameOver);
       setWinner(winner);
@@ -166,7 +167,7 @@ const PokemonGame = () => {
         <div className="pokemon-image">
           {pokemon.image_path ? (
             <img
-              src={`http://localhost:5000/api/images/${pokemon.image_path}`}
+              src={`http://localhost:5000/api/images/${pokemon.image_path}?size=256`}
               alt={pokemon.pokemon.name}
               onError={(e) => {
                 e.target.onerror = null;